@@ -0,0 +1,252 @@
+# ASGI-вход: uvicorn asgi:app
+# Маршруты те же, что в main.py — обработчики Flask вызываются напрямую, без HTTP между ними.
+# Чтения идут параллельно в пуле потоков под общей блокировкой хранилища и читают данные из памяти, а все изменения
+# проходят через одну asyncio-очередь: писатель применяет накопившиеся запросы пачкой и пишет на диск один раз.
+# Между запросами пачки писатель пропускает ждущих читателей, так что чтение не ждёт пачку целиком
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from main import READ_METHODS, app as flask_app, default_shard, user_shards, using_shard
+from shards import split_user_path
+from store import PersistError
+
+MAX_WRITE_BATCH = 64
+
+
+def wsgi_environ(scope, body):
+    path = scope.get("root_path", "") + scope["path"]
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": "",
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+        "CONTENT_LENGTH": str(len(body)),
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def start_flask(environ):
+    # (статус, заголовки, итератор тела) — тело может быть потоком (SSE)
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"] = int(status.split(" ", 1)[0])
+        response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+    chunks = flask_app.wsgi_app(environ, start_response)
+    return response["status"], response["headers"], chunks
+
+
+def close_body(chunks):
+    if hasattr(chunks, "close"):
+        chunks.close()
+
+
+def call_flask(environ):
+    # Ответ собирается целиком: (статус, заголовки, тело)
+    status, headers, chunks = start_flask(environ)
+    try:
+        body = b"".join(chunks)
+    finally:
+        close_body(chunks)
+    return status, headers, body
+
+
+def is_mutation(method, path):
+    if method not in READ_METHODS:
+        return True
+    # Этот GET-запрос тоже пишет: создаёт категории по умолчанию.
+    # Проверка без блокировки — если данные устарели и запрос ушёл в чтение, обработчик запишет сам,
+    # под блокировкой хранилища, просто не в общей пачке
+    user_key, path = split_user_path(path)
+    if method == "GET" and path == "/categories/":
+        shard = user_shards.peek(user_key) if user_key else default_shard
+        # Шард ещё не открыт — его откроет (и при необходимости заполнит) писатель
+        return shard is None or not shard.store.data["categories"]
+    return False
+
+
+# Единственный писатель: изменения применяются по очереди, диск — один раз на пачку
+class MutationQueue:
+    def __init__(self, max_batch=MAX_WRITE_BATCH):
+        self.max_batch = max_batch
+        self.queue = None
+        self.task = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store-writer")
+
+    def start(self):
+        if self.task is None:
+            self.queue = asyncio.Queue()
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def submit(self, environ):
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((environ, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            while len(items) < self.max_batch and not self.queue.empty():
+                items.append(self.queue.get_nowait())
+
+            try:
+                results = await loop.run_in_executor(self.executor, self.apply, [environ for environ, _ in items])
+            except Exception as e:
+                # Не удалось записать пачку на диск — ни один запрос из неё не считается выполненным
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(items, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def apply(self, environs):
+        # Ответы отдаются только после записи пачки на диск — по одной записи на каждого пользователя из пачки.
+        # Блокировки шардов берём в одном порядке, чтобы писатели разных процессов не ждали друг друга по кругу
+        with ExitStack() as stack:
+            stores = []
+            writing_users = {}
+            for environ in environs:
+                user_key = split_user_path(environ["PATH_INFO"])[0] or ""
+                writing_users[user_key] = writing_users.get(user_key, False) or environ["REQUEST_METHOD"] not in READ_METHODS
+            for user_key in sorted(writing_users):
+                shard = stack.enter_context(using_shard(user_key, create=writing_users[user_key]))
+                if shard is None:
+                    # GET /categories/ несуществующего пользователя — обработчик ответит 404
+                    continue
+                stack.enter_context(shard.store.batch())
+                shard.store.get()
+                stores.append(shard.store)
+            results = []
+            for environ in environs:
+                results.append(call_flask(environ))
+                # Читатели увидят уже применённые, но ещё не записанные изменения — те же, что и после записи пачки.
+                # LOCK_EX при этом не отпускается: другие воркеры пачку не прервут
+                for store in stores:
+                    store.lock.let_readers_in()
+            return results
+
+
+writer = MutationQueue()
+read_executor = ThreadPoolExecutor(thread_name_prefix="store-reader")
+# Long-poll и SSE подолгу ждут событий в потоке — у них свой пул, чтобы не занимать потоки обычных чтений
+WAITING_PATHS = ("/notifications/poll", "/notifications/stream")
+MAX_WAITING_CLIENTS = 256
+wait_executor = ThreadPoolExecutor(max_workers=MAX_WAITING_CLIENTS, thread_name_prefix="store-waiter")
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return body
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            writer.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await writer.stop()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    environ = wsgi_environ(scope, await read_body(receive))
+    if is_mutation(scope["method"], scope["path"]):
+        try:
+            status, headers, body = await writer.submit(environ)
+        except PersistError:
+            # Пачка не записалась на диск — ни один её запрос не выполнен (см. MutationQueue.run)
+            status, headers, body = 500, [(b"content-type", b"application/json")], b'{"error": "Failed to save changes"}'
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+        return
+
+    executor = wait_executor if scope["path"] in WAITING_PATHS else read_executor
+    await stream_response(executor, environ, receive, send)
+
+
+async def stream_response(executor, environ, receive, send):
+    # Тело отдаётся по мере готовности кусков; при отключении клиента поток закрываем
+    loop = asyncio.get_running_loop()
+    status, headers, chunks = await loop.run_in_executor(executor, start_flask, environ)
+    iterator = iter(chunks)
+    disconnected = loop.create_task(wait_disconnect(receive))
+    next_chunk = None
+    try:
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        while True:
+            next_chunk = loop.run_in_executor(executor, next, iterator, None)
+            await asyncio.wait([next_chunk, disconnected], return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                return
+            chunk = next_chunk.result()
+            if chunk is None:
+                break
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        disconnected.cancel()
+        # Генератор может как раз ждать следующего события в потоке пула — закрываем его, когда дождётся
+        if next_chunk is not None and not next_chunk.done():
+            next_chunk.add_done_callback(lambda _: executor.submit(close_body, chunks))
+        else:
+            executor.submit(close_body, chunks)
+
+
+async def wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
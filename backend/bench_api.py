@@ -0,0 +1,165 @@
+# Замеры горячих путей API на синтетических данных (gen_dataset.py) через тестовый клиент Flask:
+# задержки (p50/p95/p99), пропускная способность и пиковая память на каждый сценарий.
+# python bench_api.py [--sizes 1000,10000,100000] [--mode json|journal|sqlite] [--iterations 50]
+#                     [--output report.json] [--compare base_report.json]
+# Каждый размер меряется в отдельном процессе со своим каталогом данных — как отдельно запущенный сервер
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+# Сколько прогонов сценария под tracemalloc для оценки пиковой памяти (он сильно замедляет код, поэтому отдельно)
+MEMORY_ITERATIONS = 3
+
+
+def percentile(sorted_values, fraction):
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def measure(action, iterations):
+    timings = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        action(i)
+        timings.append(time.perf_counter() - call_started)
+    total = time.perf_counter() - started
+
+    tracemalloc.start()
+    for i in range(MEMORY_ITERATIONS):
+        action(iterations + i)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "p50_ms": percentile(timings, 0.50) * 1000,
+        "p95_ms": percentile(timings, 0.95) * 1000,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+        "mean_ms": sum(timings) / len(timings) * 1000,
+        "ops_per_s": iterations / total if total else 0.0,
+        "peak_kb": peak / 1024,
+    }
+
+
+def scenarios(main, client, today, rng):
+    # (имя, действие(i)); ответ читается целиком — потоковые ответы иначе не закодировались бы
+    def get(url, invalidate=True):
+        def action(i):
+            if invalidate:
+                main.default_shard.response_cache.invalidate()
+            response = client.get(url(i) if callable(url) else url)
+            assert response.status_code == 200, (url, response.status_code)
+            response.get_data()
+        return action
+
+    store = main.default_shard.store
+    days = [today - timedelta(days=rng.randrange(365 * 3)) for _ in range(1000)]
+    open_ids = [t["id"] for t in store.data["tasks"] if not t["completed"] and t.get("repeat_interval") in (None, "none")]
+    rng.shuffle(open_ids)
+    # Для генерации — будущие дни подряд: каждый прогон создаёт экземпляры нового дня и сохраняет их
+    future_days = iter(today + timedelta(days=n) for n in range(1, 100000))
+
+    def complete(i):
+        response = client.put(f'/tasks/{open_ids[i % len(open_ids)]}/complete')
+        assert response.status_code == 200
+
+    def generate(i):
+        main.default_shard.daily_job(next(future_days), False)
+
+    return [
+        ("get_tasks", get('/tasks/')),
+        ("get_tasks_cached", get('/tasks/', invalidate=False)),
+        ("get_calendar_tasks", get(lambda i: f'/calendar/{days[i % len(days)].isoformat()}')),
+        ("get_calendar_month", get(lambda i: f'/calendar?from={days[i % len(days)].replace(day=1).isoformat()}'
+                                             f'&to={(days[i % len(days)].replace(day=1) + timedelta(days=30)).isoformat()}')),
+        ("get_stats_today", get('/stats/')),
+        ("get_stats_year", get(f'/stats?from={(today - timedelta(days=365)).isoformat()}&to={today.isoformat()}&group_by=week')),
+        ("generate_today_tasks_logic", generate),
+        ("complete_task", complete),
+    ]
+
+
+def run_size(workdir, count, mode, iterations, results):
+    os.chdir(workdir)
+    os.environ["STORAGE_MODE"] = mode
+    # Весь набор остаётся в рабочем множестве — замеряем худший случай, без архивации
+    os.environ.setdefault("ARCHIVE_AFTER_DAYS", "0")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import codec
+    from gen_dataset import generate_dataset
+    from store import atomic_write
+
+    atomic_write("tasks_data.json", codec.encode_data(generate_dataset(count)))
+    started = time.perf_counter()
+    import main
+    startup_ms = (time.perf_counter() - started) * 1000
+
+    client = main.app.test_client()
+    rng = random.Random(count)
+    report = {"tasks": count, "startup_ms": startup_ms, "scenarios": {}}
+    for name, action in scenarios(main, client, date.today(), rng):
+        report["scenarios"][name] = measure(action, iterations)
+    report["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put(report)
+
+
+def print_report(report, base=None):
+    print(f"mode {report['mode']}, codec {report['codec']}, {report['iterations']} iterations")
+    for size in report["sizes"]:
+        base_size = next((b for b in (base or {}).get("sizes", []) if b["tasks"] == size["tasks"]), None)
+        print(f"\n{size['tasks']} tasks: startup {size['startup_ms']:.0f} ms, max RSS {size['max_rss_kb'] / 1024:.0f} MB")
+        print(f"  {'scenario':<28} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9} {'peak KB':>9}"
+              + (f" {'p50 Δ':>8} {'p95 Δ':>8}" if base_size else ""))
+        for name, stats in size["scenarios"].items():
+            line = (f"  {name:<28} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}"
+                    f" {stats['ops_per_s']:>9.0f} {stats['peak_kb']:>9.0f}")
+            base_stats = base_size["scenarios"].get(name) if base_size else None
+            if base_stats:
+                # Отрицательная разница — стало быстрее
+                for key in ("p50_ms", "p95_ms"):
+                    change = (stats[key] - base_stats[key]) / base_stats[key] * 100 if base_stats[key] else 0.0
+                    line += f" {change:>+7.0f}%"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the task API hot paths on synthetic data")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--mode", default=os.environ.get("STORAGE_MODE", "json"), choices=["json", "journal", "sqlite"])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--compare", help="previous JSON report to compare against")
+    args = parser.parse_args()
+
+    import codec
+    report = {"mode": args.mode, "codec": codec.codec.name, "iterations": args.iterations, "sizes": []}
+    context = multiprocessing.get_context("spawn")
+    for count in [int(size) for size in args.sizes.split(",")]:
+        results = context.Queue()
+        workdir = tempfile.mkdtemp(prefix=f"bench_api_{count}_")
+        process = context.Process(target=run_size, args=(workdir, count, args.mode, args.iterations, results))
+        process.start()
+        report["sizes"].append(results.get())
+        process.join()
+
+    base = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            base = json.load(f)
+    print_report(report, base)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# Замер загрузки и сохранения файла данных для каждого установленного кодека и формата:
+# python bench_codec.py [размеры через запятую, по умолчанию 1000,10000,100000]
+# Сохранение — кодирование + запись во временный файл с fsync + подмена, загрузка — чтение + разбор
+import os
+import sys
+import tempfile
+import time
+
+import codec
+from gen_dataset import generate_dataset
+from store import atomic_write
+
+REPEATS = 3
+
+
+def best_of(action):
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        action()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def bench(path, data, json_codec, data_format):
+    def save():
+        atomic_write(path, codec.encode_data(data, data_format, json_codec))
+
+    def load():
+        with open(path, 'rb') as f:
+            codec.decode_data(f.read(), json_codec)
+
+    save_seconds = best_of(save)
+    load_seconds = best_of(load)
+    return save_seconds, load_seconds, os.path.getsize(path)
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1].split(",")] if len(sys.argv) > 1 else [1000, 10000, 100000]
+    codecs = codec.available_codecs()
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_codec_"), "tasks_data.json")
+
+    print(f"{'tasks':>7} {'codec':<8} {'format':<8} {'save ms':>9} {'load ms':>9} {'size KB':>9}")
+    for count in sizes:
+        data = generate_dataset(count)
+        for json_codec in codecs.values():
+            for data_format in codec.STORAGE_FORMATS:
+                # msgpack не зависит от JSON-кодека — меряем его один раз
+                if data_format == "msgpack" and (codec.msgspec is None or json_codec is not next(iter(codecs.values()))):
+                    continue
+                save_seconds, load_seconds, size = bench(path, data, json_codec, data_format)
+                name = "msgspec" if data_format == "msgpack" else json_codec.name
+                print(f"{count:>7} {name:<8} {data_format:<8} {save_seconds * 1000:>9.1f} {load_seconds * 1000:>9.1f} {size / 1024:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
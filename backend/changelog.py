@@ -0,0 +1,49 @@
+from collections import deque
+
+from store import TOMBSTONE_LIMIT
+
+CHANGE_LOG_LIMIT = 10000
+
+
+# Журнал изменений для дельта-синхронизации: (поколение, id задачи, удалена ли) по каждому commit().
+# Поколение общее для всех воркеров (см. TaskStore.generation) и записано в сами данные — в revision задачи
+# и в список удалений, поэтому после перечитывания (запись другого воркера, откат пачки) журнал
+# собирается заново из сохранённого состояния, а не начинается с нуля
+class ChangeLog:
+    def __init__(self, limit=CHANGE_LOG_LIMIT):
+        self.limit = limit
+        self.entries = deque(maxlen=limit)
+        # Изменения новее floor журнал знает полностью; про более ранние — нет
+        self.floor = 0
+
+    def reset(self, store):
+        # Задачи без revision не менялись с тех пор, как его начали записывать, — они старше любого since
+        entries = [(task["revision"], task["id"], False) for task in store.data["tasks"] if task.get("revision")]
+        entries.extend((generation, task_id, True) for task_id, generation in store.data["deleted"])
+        entries.sort()
+        self.floor = 0
+        if len(store.data["deleted"]) >= TOMBSTONE_LIMIT:
+            # Удаления старше самого раннего сохранённого уже забыты
+            self.floor = store.data["deleted"][0][1]
+        if len(entries) > self.limit:
+            self.floor = max(self.floor, entries[-self.limit - 1][0])
+        self.entries = deque(entries[-self.limit:], maxlen=self.limit)
+
+    def apply(self, store, changes):
+        generation = store.generation or 0
+        for old, new in changes:
+            if len(self.entries) == self.entries.maxlen:
+                self.floor = max(self.floor, self.entries[0][0])
+            self.entries.append((generation, (new or old).id, new is None))
+
+    def since(self, store, since):
+        # {id задачи: удалена ли} для изменений новее since; None — журнал этого не покрывает, нужен полный снимок
+        generation = store.generation or 0
+        if since < self.floor or since > generation:
+            return None
+        changed = {}
+        for entry_generation, task_id, deleted in reversed(self.entries):
+            if entry_generation <= since:
+                break
+            changed.setdefault(task_id, deleted)
+        return changed
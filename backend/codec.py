@@ -0,0 +1,126 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+class CodecUnavailable(RuntimeError):
+    pass
+
+
+# Кодеки JSON: orjson или msgspec, если установлены, иначе стандартный json.
+# Все отдают UTF-8 байты без \u-экранирования (как ensure_ascii=False) и принимают str или bytes
+class StdlibCodec:
+    name = "json"
+
+    def dumps(self, obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def dumps_pretty(self, obj):
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+
+    def loads(self, content):
+        return json.loads(content)
+
+
+class OrjsonCodec:
+    name = "orjson"
+
+    def dumps(self, obj):
+        return orjson.dumps(obj)
+
+    def dumps_pretty(self, obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+
+    def loads(self, content):
+        return orjson.loads(content)
+
+
+class MsgspecCodec:
+    name = "msgspec"
+
+    def __init__(self):
+        self.encoder = msgspec.json.Encoder()
+        self.decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj):
+        return self.encoder.encode(obj)
+
+    def dumps_pretty(self, obj):
+        return msgspec.json.format(self.encoder.encode(obj), indent=2)
+
+    def loads(self, content):
+        return self.decoder.decode(content)
+
+
+def available_codecs():
+    codecs = {}
+    if orjson is not None:
+        codecs["orjson"] = OrjsonCodec()
+    if msgspec is not None:
+        codecs["msgspec"] = MsgspecCodec()
+    codecs["json"] = StdlibCodec()
+    return codecs
+
+
+def select_codec(name="auto"):
+    # JSON_CODEC=auto берёт самый быстрый из установленных; явно названный, но не установленный — ошибка
+    codecs = available_codecs()
+    if name == "auto":
+        return next(iter(codecs.values()))
+    if name not in codecs:
+        raise CodecUnavailable(f"JSON codec '{name}' is not installed (available: {', '.join(codecs)})")
+    return codecs[name]
+
+
+# Формат файла данных (и архива): compact — JSON в одну строку, pretty — JSON с отступами для чтения глазами,
+# msgpack — двоичный, самый быстрый и компактный (нужен msgspec). При чтении формат определяется по содержимому,
+# так что STORAGE_FORMAT можно менять в любой момент: файл перепишется в новом формате при следующем сохранении
+STORAGE_FORMATS = ("compact", "pretty", "msgpack")
+
+codec = select_codec(os.environ.get("JSON_CODEC", "auto"))
+storage_format = os.environ.get("STORAGE_FORMAT", "compact")
+if storage_format not in STORAGE_FORMATS:
+    raise ValueError(f"STORAGE_FORMAT must be one of: {', '.join(STORAGE_FORMATS)}")
+
+
+def dumps(obj):
+    return codec.dumps(obj)
+
+
+def loads(content):
+    return codec.loads(content)
+
+
+def encode_data(obj, data_format=None, json_codec=None):
+    data_format = data_format or storage_format
+    json_codec = json_codec or codec
+    if data_format == "msgpack":
+        if msgspec is None:
+            raise CodecUnavailable("STORAGE_FORMAT=msgpack requires msgspec")
+        return msgspec.msgpack.encode(obj)
+    if data_format == "pretty":
+        return json_codec.dumps_pretty(obj)
+    return json_codec.dumps(obj)
+
+
+def is_msgpack(content):
+    # Документ хранилища — всегда словарь: в msgpack первый байт у него fixmap (0x80–0x8f), map16 или map32,
+    # а JSON начинается с «{» или пробелов
+    return bool(content) and (0x80 <= content[0] <= 0x8f or content[0] in (0xde, 0xdf))
+
+
+def decode_data(content, json_codec=None):
+    if not is_msgpack(content):
+        return (json_codec or codec).loads(content)
+    if msgspec is None:
+        raise CodecUnavailable("Data file is in msgpack format, install msgspec to read it")
+    return msgspec.msgpack.decode(content)
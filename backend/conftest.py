@@ -0,0 +1,3 @@
+def pytest_configure(config):
+    # Долгие проверки (несколько процессов-воркеров); пропустить: pytest -m "not slow"
+    config.addinivalue_line("markers", "slow: multi-process checks that take several seconds")
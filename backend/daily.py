@@ -0,0 +1,74 @@
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+# Сколько пропущенных дней (сервер не работал) досоздавать при запуске
+CATCH_UP_DAYS = int(os.environ.get("MATERIALIZE_CATCH_UP_DAYS", "7"))
+# Даже если до полуночи далеко, просыпаемся хотя бы раз в час: часы могли перевести, машина — уснуть
+MAX_SLEEP_SECONDS = 3600
+
+logger = logging.getLogger(__name__)
+
+
+# Ежедневная работа с хранилищем (создание экземпляров повторений, архивация) — в фоновом потоке в полночь,
+# а не внутри GET. Последний обработанный день хранится рядом с поколением хранилища (StoreLock), поэтому
+# из нескольких воркеров день обрабатывает один, а после простоя сервера пропущенные дни догоняются при запуске
+class DailyScheduler:
+    def __init__(self, store, job, key="materialized_day", catch_up_days=CATCH_UP_DAYS):
+        # job(day, is_last) вызывается под блокировкой хранилища по разу на каждый день по порядку;
+        # is_last — это сегодняшний день, после него работа до следующей полуночи сделана
+        self.store = store
+        self.job = job
+        self.key = key
+        self.catch_up_days = catch_up_days
+        self.done_day = None
+        self.thread = None
+        self.pid = None
+        self.stopped = threading.Event()
+
+    def due(self, today=None):
+        return self.done_day != (today or date.today())
+
+    def run_pending(self, today=None):
+        today = today or date.today()
+        if not self.due(today):
+            return []
+        with self.store.lock:
+            self.store.get()
+            done = self.store.lock.read_value(self.key)
+            last_day = datetime.fromisoformat(done).date() if done else today - timedelta(days=1)
+            first_day = max(last_day + timedelta(days=1), today - timedelta(days=max(self.catch_up_days, 1) - 1))
+            days = []
+            # Все дни — одной пачкой: одна запись на диск; отметку о сделанном дне ставим только после неё
+            with self.store.batch():
+                day = first_day
+                while day <= today:
+                    self.job(day, day == today)
+                    days.append(day)
+                    day += timedelta(days=1)
+            if days:
+                self.store.lock.write_value(self.key, today.isoformat())
+            self.done_day = today
+            return days
+
+    def ensure_running(self):
+        # Поток запускается в каждом процессе отдельно: после fork (gunicorn --preload) потока родителя нет
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, daemon=True, name="daily-jobs")
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.run_pending()
+            except Exception:
+                # Поток не должен умирать из-за одного неудачного дня: пишем ошибку с трассировкой и пробуем снова позже
+                logger.exception("Daily job failed")
+            now = datetime.now()
+            midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            self.stopped.wait(min((midnight - now).total_seconds() + 1, MAX_SLEEP_SECONDS))
@@ -0,0 +1,110 @@
+# Синтетические данные для замеров: шаблоны повторов (daily/weekly/monthly) с экземплярами за несколько лет
+# и разовые задачи — в той же форме, что создаёт API.
+# python gen_dataset.py <число задач> [файл, по умолчанию tasks_data.json] [seed]
+import random
+import sys
+from datetime import date, timedelta
+
+import codec
+from store import atomic_write
+
+CATEGORIES = [
+    {"id": 1, "name": "Работа", "color": "#3B82F6", "icon": "💼"},
+    {"id": 2, "name": "Дом", "color": "#10B981", "icon": "🏠"},
+    {"id": 3, "name": "Здоровье", "color": "#EF4444", "icon": "❤️"},
+    {"id": 4, "name": "Учёба", "color": "#8B5CF6", "icon": "📚"},
+    {"id": 5, "name": "Покупки", "color": "#F59E0B", "icon": "🛒"},
+    {"id": 6, "name": "Личное", "color": "#EC4899", "icon": "⭐"},
+]
+# Доля экземпляров повторов среди всех задач и вероятность выполнить прошедшую задачу
+INSTANCE_SHARE = 0.6
+COMPLETION_RATE = 0.8
+
+
+def occurs_on(kind, start, day):
+    if kind == "daily":
+        return True
+    if kind == "weekly":
+        return day.weekday() in (0, 2, 4)
+    return day.day == start.day
+
+
+def make_task(rng, task_id, day, title):
+    return {
+        "id": task_id,
+        "title": title,
+        "description": "Описание задачи" if rng.random() < 0.3 else "",
+        "category_id": rng.choice(CATEGORIES)["id"],
+        "priority": rng.choice(["low", "medium", "medium", "high"]),
+        "estimated_time": rng.choice([0, 15, 30, 60, 90]),
+        "date": day.isoformat(),
+        "time": f"{rng.randrange(7, 23):02d}:{rng.choice([0, 15, 30, 45]):02d}" if rng.random() < 0.5 else None,
+        "repeat_interval": "none",
+        "repeat_days": None,
+        "repeat_until": None,
+        "completed": False,
+        "created_at": day.isoformat(),
+        "completed_at": None,
+        "original_task_id": None,
+        "is_exception": False,
+    }
+
+
+def complete(rng, task, day, today):
+    if day < today and rng.random() < COMPLETION_RATE:
+        task["completed"] = True
+        task["completed_at"] = f"{day.isoformat()}T{rng.randrange(8, 23):02d}:{rng.randrange(60):02d}:00.000000"
+
+
+def generate_dataset(count, seed=1, today=None, years=3):
+    rng = random.Random(seed)
+    today = today or date.today()
+    history_start = today - timedelta(days=365 * years)
+    tasks = []
+
+    # Шаблоны с экземплярами за каждый подходящий день до конца повтора или до вчера (сегодняшний создаст ежедневная работа)
+    instance_budget = int(count * INSTANCE_SHARE)
+    while instance_budget > 0 and len(tasks) < count:
+        kind = rng.choice(["daily", "daily", "weekly", "weekly", "monthly"])
+        start = history_start + timedelta(days=rng.randrange(365 * years))
+        template = make_task(rng, len(tasks) + 1, start, f"Привычка {len(tasks) + 1}")
+        template["repeat_interval"] = kind
+        template["repeat_days"] = "0,2,4" if kind == "weekly" else None
+        # Привычка живёт от месяца до года; закончившиеся получают repeat_until
+        end = start + timedelta(days=rng.randrange(30, 365))
+        if end < today:
+            template["repeat_until"] = end.isoformat()
+        tasks.append(template)
+        day = start
+        while day < min(end + timedelta(days=1), today) and instance_budget > 0 and len(tasks) < count:
+            if occurs_on(kind, start, day):
+                instance = dict(template, id=len(tasks) + 1, date=day.isoformat(), created_at=day.isoformat(),
+                                original_task_id=template["id"], repeat_interval="none", repeat_days=None)
+                complete(rng, instance, day, today)
+                tasks.append(instance)
+                instance_budget -= 1
+            day += timedelta(days=1)
+
+    # Разовые задачи по всей истории и немного на ближайший месяц вперёд
+    span = (today - history_start).days + 30
+    while len(tasks) < count:
+        day = history_start + timedelta(days=rng.randrange(span))
+        task = make_task(rng, len(tasks) + 1, day, f"Задача {len(tasks) + 1}")
+        complete(rng, task, day, today)
+        tasks.append(task)
+
+    return {"tasks": tasks, "categories": [dict(c) for c in CATEGORIES]}
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    path = sys.argv[2] if len(sys.argv) > 2 else "tasks_data.json"
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    data = generate_dataset(count, seed)
+    atomic_write(path, codec.encode_data(data))
+    templates = sum(1 for t in data["tasks"] if t["repeat_interval"] != "none")
+    print(f"Wrote {len(data['tasks'])} tasks ({templates} recurring templates) to {path}")
+
+
+if __name__ == '__main__':
+    main()
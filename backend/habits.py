@@ -0,0 +1,250 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from datetime import timedelta
+from itertools import chain
+
+
+def popcount(value):
+    return bin(value).count("1")
+
+
+def month_number(day):
+    return day.year * 12 + day.month - 1
+
+
+# Порядковые номера повторений шаблона: выполненные подряд повторения — подряд идущие номера,
+# поэтому серия (streak) — это отрезок целых чисел, и для weekly/monthly тоже
+class RepeatRule:
+    def __init__(self, record):
+        self.created = record.created
+        self.interval = record.repeat_interval
+        self.mask = record.weekday_mask if record.repeat_interval == "weekly" else None
+        self.repeat_until = record.repeat_until
+        if self.interval == "weekly" and self.mask is None:
+            self.interval = None
+
+    def key(self):
+        return (self.created, self.interval, self.mask, self.repeat_until)
+
+    def is_scheduled(self, day):
+        if self.created is None or day < self.created:
+            return False
+        if self.interval == "daily":
+            return True
+        if self.interval == "weekly":
+            return bool(self.mask >> day.weekday() & 1)
+        if self.interval == "monthly":
+            return day.day == self.created.day
+        return day == self.created
+
+    def scheduled_count(self, day):
+        # Сколько повторений приходится на [created, day]
+        if self.created is None:
+            return 0
+        if self.repeat_until and day > self.repeat_until:
+            day = self.repeat_until
+        if day < self.created:
+            return 0
+
+        if self.interval == "daily":
+            return (day - self.created).days + 1
+        if self.interval == "weekly":
+            first_monday = self.created - timedelta(days=self.created.weekday())
+            weeks = (day - first_monday).days // 7
+            return (weeks * popcount(self.mask) +
+                    popcount(self.mask & ((2 << day.weekday()) - 1)) -
+                    popcount(self.mask & ((1 << self.created.weekday()) - 1)))
+        if self.interval == "monthly":
+            count = 0
+            for number in range(month_number(self.created), month_number(day) + 1):
+                year, month = divmod(number, 12)
+                try:
+                    occurrence = self.created.replace(year=year, month=month + 1)
+                except ValueError:
+                    continue
+                if occurrence <= day:
+                    count += 1
+            return count
+        return 1
+
+    def occurrence_number(self, day):
+        if not self.is_scheduled(day) or (self.repeat_until and day > self.repeat_until):
+            return None
+        return self.scheduled_count(day) - 1
+
+
+# Агрегаты одной привычки: выполненные повторения хранятся отрезками подряд идущих номеров
+class HabitState:
+    def __init__(self, rule):
+        self.rule = rule
+        self.completions = Counter()   # номер повторения -> число выполненных экземпляров
+        self.completed_numbers = []    # те же номера по порядку — для подсчёта выполненных до заданного
+        self.run_starts = []
+        self.runs = {}                 # начало отрезка -> конец
+        self.run_ends = {}             # конец отрезка -> начало
+        self.run_lengths = Counter()
+        self.per_week = Counter()
+        self.per_month = Counter()
+
+    def add(self, day):
+        number = self.rule.occurrence_number(day)
+        if number is None:
+            return
+        self.completions[number] += 1
+        if self.completions[number] > 1:
+            return
+        insort(self.completed_numbers, number)
+
+        iso_year, iso_week, _ = day.isocalendar()
+        self.per_week[f"{iso_year}-W{iso_week:02d}"] += 1
+        self.per_month[f"{day.year}-{day.month:02d}"] += 1
+
+        start, end = number, number
+        if number - 1 in self.run_ends:
+            start = self.run_ends[number - 1]
+            self._drop_run(start)
+        if number + 1 in self.runs:
+            end = self.runs[number + 1]
+            self._drop_run(number + 1)
+        self._add_run(start, end)
+
+    def remove(self, day):
+        number = self.rule.occurrence_number(day)
+        if number is None or not self.completions[number]:
+            return
+        self.completions[number] -= 1
+        if self.completions[number]:
+            return
+        del self.completions[number]
+        del self.completed_numbers[bisect_left(self.completed_numbers, number)]
+
+        iso_year, iso_week, _ = day.isocalendar()
+        for counter, key in ((self.per_week, f"{iso_year}-W{iso_week:02d}"),
+                             (self.per_month, f"{day.year}-{day.month:02d}")):
+            counter[key] -= 1
+            if not counter[key]:
+                del counter[key]
+
+        start = self.run_starts[bisect_right(self.run_starts, number) - 1]
+        end = self.runs[start]
+        self._drop_run(start)
+        if start < number:
+            self._add_run(start, number - 1)
+        if number < end:
+            self._add_run(number + 1, end)
+
+    def _add_run(self, start, end):
+        insort(self.run_starts, start)
+        self.runs[start] = end
+        self.run_ends[end] = start
+        self.run_lengths[end - start + 1] += 1
+
+    def _drop_run(self, start):
+        end = self.runs.pop(start)
+        del self.run_ends[end]
+        self.run_starts.pop(bisect_right(self.run_starts, start) - 1)
+        length = end - start + 1
+        self.run_lengths[length] -= 1
+        if not self.run_lengths[length]:
+            del self.run_lengths[length]
+
+    def run_length_until(self, number):
+        # Длина отрезка, который содержит number, считая от его начала до number
+        i = bisect_right(self.run_starts, number) - 1
+        if i < 0:
+            return 0
+        start = self.run_starts[i]
+        return number - start + 1 if self.runs[start] >= number else 0
+
+    def longest_run_until(self, number):
+        # Самый длинный отрезок среди повторений с номерами не больше number: отрезки, уходящие дальше
+        # (выполненные заранее будущие повторения), вычитаем из run_lengths, а пересекающий number обрезаем
+        i = bisect_right(self.run_starts, number)
+        beyond = Counter()
+        for start in self.run_starts[max(i - 1, 0):]:
+            end = self.runs[start]
+            if end > number:
+                beyond[end - start + 1] += 1
+        longest = max((length for length, count in self.run_lengths.items() if count > beyond[length]), default=0)
+        return max(longest, self.run_length_until(number))
+
+    def summary(self, today):
+        scheduled = self.rule.scheduled_count(today)
+        last = scheduled - 1
+        current_streak = self.run_length_until(last)
+        if not current_streak and self.rule.is_scheduled(today):
+            # Сегодняшнее повторение ещё не выполнено — серия не прервана, считаем по вчерашнее
+            current_streak = self.run_length_until(last - 1)
+
+        # Будущие повторения можно отметить заранее (виртуальный экземпляр), но в процент и серии
+        # они попадают, только когда наступят — иначе процент бывает больше 100
+        total = bisect_right(self.completed_numbers, last)
+        return {
+            "current_streak": current_streak,
+            "longest_streak": self.longest_run_until(last),
+            "total_completions": total,
+            "scheduled_occurrences": scheduled,
+            "completion_rate": (total / scheduled * 100) if scheduled > 0 else 0,
+            "completions_per_week": dict(sorted(self.per_week.items())),
+            "completions_per_month": dict(sorted(self.per_month.items()))
+        }
+
+
+# Подписчик хранилища: агрегаты по каждому повторяющемуся шаблону обновляются при commit(),
+# а не пересчитываются по истории экземпляров на каждый запрос
+class HabitAggregates:
+    def __init__(self):
+        self.habits = {}
+
+    def reset(self, store):
+        self.habits = {template_id: HabitState(RepeatRule(store.records[template_id]))
+                       for template_id in store.templates}
+        self._add_completions(store, self.habits)
+
+    def _rebuild(self, store, template_ids):
+        states = {template_id: HabitState(RepeatRule(store.records[template_id]))
+                  for template_id in template_ids}
+        self._add_completions(store, states)
+        self.habits.update(states)
+
+    def _add_completions(self, store, states):
+        # Один проход по всем записям, включая архив: экземпляры с одинаковым днём повторения тоже учитываются
+        for record in chain(store.records.values(), store.archived_records()):
+            state = states.get(record.original_task_id)
+            if state is not None and record.completed and record.created is not None:
+                state.add(record.created)
+
+    def apply(self, store, changes):
+        rebuild = set()
+        for old, new in changes:
+            record = new or old
+            if record.original_task_id is None:
+                state = self.habits.get(record.id)
+                if new is None or new.id not in store.templates:
+                    self.habits.pop(record.id, None)
+                elif state is None or state.rule.key() != RepeatRule(new).key():
+                    rebuild.add(record.id)
+
+        for old, new in changes:
+            for record, delta in ((old, -1), (new, 1)):
+                if record is None or record.original_task_id is None or not record.completed:
+                    continue
+                if record.original_task_id in rebuild:
+                    continue
+                state = self.habits.get(record.original_task_id)
+                if state is None or record.created is None:
+                    continue
+                if delta > 0:
+                    state.add(record.created)
+                elif new is not None or not store.is_archived(record.id):
+                    # Перенос в архив — не удаление: выполнение остаётся в истории привычки
+                    state.remove(record.created)
+
+        if rebuild:
+            self._rebuild(store, rebuild)
+
+    def summary(self, template_id, today):
+        state = self.habits.get(template_id)
+        if state is None:
+            return None
+        return {"template_id": template_id, **state.summary(today)}
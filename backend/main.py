@@ -1,20 +1,207 @@
 # /home/timurkov/habit-tracker3/backend/flask_app.py
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
 from flask_cors import CORS
+from werkzeug.routing import BaseConverter
 from datetime import datetime, date, timedelta
 from enum import Enum
 import json
 import os
-from typing import Optional, List, Dict, Any
+import time
+import zlib
+from typing import Optional, List, Dict, Any, Union
 from dataclasses import dataclass
 from pydantic import BaseModel
 from functools import wraps
+from contextlib import contextmanager
+from contextvars import ContextVar
+from werkzeug.local import LocalProxy
+from collections import namedtuple
+from itertools import chain, islice
+from bisect import bisect_left
+import codec
+import metrics
+from store import PersistError, TaskRecord, open_store, task_day
+from stats import StatsColumns, StatsEngine
+from habits import HabitAggregates
+from notifications import NotificationScheduler, sse_events
+from changelog import ChangeLog
+from response_cache import ResponseCache
+from search import SearchIndex, tokenize
+from daily import DailyScheduler
+from shards import USER_PREFIX, ShardPool, shard_path, split_user_path
+from profiler import SlowRequestProfiler
 
 # Flask приложение
 app = Flask(__name__)
 CORS(app)
 
+# Виртуальный экземпляр повторяющейся задачи: id вида template_<id шаблона>_<YYYY-MM-DD>
+VirtualTaskRef = namedtuple("VirtualTaskRef", ["template_id", "day"])
+
+class TaskRefConverter(BaseConverter):
+    regex = r"\d+|template_\d+_\d{4}-\d{2}-\d{2}"
+    
+    def to_python(self, value):
+        if value.isdigit():
+            return int(value)
+        _, template_id, day = value.split("_")
+        return VirtualTaskRef(int(template_id), date.fromisoformat(day))
+    
+    def to_url(self, value):
+        if isinstance(value, VirtualTaskRef):
+            return virtual_task_id(value.template_id, value.day)
+        return str(value)
+
+app.url_map.converters["task_ref"] = TaskRefConverter
+
 DATA_FILE = "tasks_data.json"
+# json — файл переписывается целиком при каждом изменении, journal — изменения дописываются в журнал
+STORAGE_MODE = os.environ.get("STORAGE_MODE", "json")
+# Данные пользователя <ключ> лежат отдельно: users/<ключ>/tasks_data.json (.sqlite3, журнал, архив — там же).
+# Маршруты те же, с префиксом /users/<ключ>/; запросы без префикса работают с общим DATA_FILE, как раньше
+USERS_DIR = os.environ.get("USERS_DIR", "users")
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Хранилище вместе со всем, что из него выводится и кэшируется, — по одному на пользователя
+class Shard:
+    def __init__(self, path):
+        self.store = open_store(path, STORAGE_MODE)
+        # Серии и процент выполнения привычек поддерживаются при каждом commit(), а не считаются по истории
+        self.habit_stats = HabitAggregates()
+        self.store.subscribe(self.habit_stats)
+        # Напоминания: сроки пересчитываются при изменениях задач, клиенты получают их через SSE или long-poll
+        self.notification_scheduler = NotificationScheduler()
+        self.store.subscribe(self.notification_scheduler)
+        # Что менялось после данного поколения хранилища — для GET /tasks/changes?since=
+        self.change_log = ChangeLog()
+        self.store.subscribe(self.change_log)
+        # Готовые ответы /tasks/ и /stats/ до следующего изменения данных или смены даты
+        self.response_cache = ResponseCache()
+        self.store.subscribe(self.response_cache)
+        # Обратный индекс слов названия и описания для GET /tasks/search
+        self.search_index = SearchIndex()
+        self.store.subscribe(self.search_index)
+        self.encoded_categories = {"version": None, "by_id": {}}
+        self.stats_engine_cache = {"revision": None, "engine": None}
+        self.daily_jobs = DailyScheduler(self.store, self.daily_job)
+    
+    def daily_job(self, day, is_today):
+        token = current_shard.set(self)
+        try:
+            run_daily_jobs(day, is_today)
+        finally:
+            current_shard.reset(token)
+    
+    def close(self):
+        self.daily_jobs.stop()
+        self.store.close()
+
+def open_user_shard(user_key, create):
+    path = shard_path(USERS_DIR, user_key, DATA_FILE)
+    # Каталог пользователя заводит только первый пишущий запрос: чтение по любому ключу не оставляет следов на диске
+    if not os.path.isdir(os.path.dirname(path)):
+        if not create:
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    shard = Shard(path)
+    # Шард мог долго не открываться — догоняем пропущенные дни сразу
+    shard.daily_jobs.run_pending()
+    return shard
+
+default_shard = Shard(DATA_FILE)
+user_shards = ShardPool(open_user_shard)
+# Шард текущего запроса (или фоновой работы). Имена ниже — прокси к нему, поэтому обработчики
+# работают со store, habit_stats и остальным как с глобальными объектами
+current_shard = ContextVar("current_shard", default=default_shard)
+store = LocalProxy(current_shard, "store")
+habit_stats = LocalProxy(current_shard, "habit_stats")
+notification_scheduler = LocalProxy(current_shard, "notification_scheduler")
+change_log = LocalProxy(current_shard, "change_log")
+response_cache = LocalProxy(current_shard, "response_cache")
+search_index = LocalProxy(current_shard, "search_index")
+encoded_categories = LocalProxy(current_shard, "encoded_categories")
+stats_engine_cache = LocalProxy(current_shard, "stats_engine_cache")
+
+# /users/<ключ>/tasks/ -> /tasks/ с данными пользователя <ключ>
+class UserPrefixMiddleware:
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+    
+    def __call__(self, environ, start_response):
+        user_key, path = split_user_path(environ.get("PATH_INFO", ""))
+        if user_key:
+            environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + USER_PREFIX + user_key
+            environ["PATH_INFO"] = path
+        environ["task_tracker.user"] = user_key
+        return self.wsgi_app(environ, start_response)
+
+app.wsgi_app = UserPrefixMiddleware(app.wsgi_app)
+
+@contextmanager
+def using_shard(user_key, create=True):
+    # Шард пользователя не вытесняется из пула, пока с ним работают; None — пользователя нет, а create=False
+    if not user_key:
+        yield default_shard
+        return
+    with user_shards.use(user_key, create) as shard:
+        yield shard
+
+# Время ответа по маршрутам (/metrics) и профилирование медленных запросов (profiler.py).
+# Замер заканчивается, когда сервер закрыл ответ, — вместе с отдачей потокового тела
+slow_request_profiler = SlowRequestProfiler()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.profile = slow_request_profiler.start(forced=request.headers.get("X-Profile") == "1")
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get("request_started")
+    if started is None:
+        return response
+    method = request.method
+    # Шаблон маршрута, а не адрес: иначе у каждой задачи и у каждого пользователя была бы своя серия
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    status = str(response.status_code)
+    profile = g.pop("profile", None)
+    label = f"{method} {request.script_root}{request.full_path}"
+    
+    def finished():
+        elapsed = time.perf_counter() - started
+        metrics.request_duration.observe(elapsed, method, route, status)
+        slow_request_profiler.finish(profile, elapsed, label)
+    
+    response.call_on_close(finished)
+    return response
+
+@app.before_request
+def activate_shard():
+    user_key = request.environ.get("task_tracker.user")
+    shard = user_shards.acquire(user_key, create=request.method not in READ_METHODS) if user_key else default_shard
+    if shard is None:
+        return jsonify({"error": "User not found"}), 404
+    g.user_key = user_key
+    g.shard_token = current_shard.set(shard)
+    shard.daily_jobs.ensure_running()
+
+@app.after_request
+def hold_shard_until_closed(response):
+    # Потоковое тело читает задачи шарда уже после обработчика: шард не должен быть вытеснен (и закрыт),
+    # пока сервер не закроет ответ
+    user_key = g.get("user_key")
+    if user_key:
+        g.user_key = None
+        response.call_on_close(lambda: user_shards.release(user_key))
+    return response
+
+@app.teardown_request
+def release_shard(exc):
+    if "shard_token" in g:
+        current_shard.reset(g.shard_token)
+        # Ответа нет (after_request не дошёл до нас) — отпускаем шард сразу
+        if g.user_key:
+            user_shards.release(g.user_key)
 
 # Enum для повторений
 class RepeatInterval(str, Enum):
@@ -55,6 +242,24 @@ class TaskDateUpdate(BaseModel):
     date: str
     time: Optional[str] = None
 
+class BatchOp(str, Enum):
+    CREATE = "create"
+    UPDATE = "update"
+    COMPLETE = "complete"
+    UNCOMPLETE = "uncomplete"
+    MOVE = "move"
+    DELETE = "delete"
+
+class BatchOperation(BaseModel):
+    op: BatchOp
+    # id задачи или виртуального экземпляра (template_<id>_<YYYY-MM-DD>); для create не нужен
+    id: Optional[Union[int, str]] = None
+    # Тело как у одиночного запроса: TaskCreate, TaskUpdate или TaskDateUpdate
+    task: Optional[Dict[str, Any]] = None
+
+class TaskBatch(BaseModel):
+    operations: List[BatchOperation]
+
 # Декоратор для валидации Pydantic
 def validate_json(schema):
     def decorator(f):
@@ -64,6 +269,9 @@ def validate_json(schema):
                 data = request.get_json()
                 validated = schema(**data) if data else schema()
                 return f(validated, *args, **kwargs)
+            except PersistError:
+                # Не ошибка запроса: ответит persist_failed
+                raise
             except Exception as e:
                 return jsonify({"error": str(e)}), 400
         return wrapper
@@ -71,177 +279,352 @@ def validate_json(schema):
 
 # Вспомогательные функции (остаются почти такими же)
 def load_data():
-    try:
-        if os.path.exists(DATA_FILE):
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                content = f.read().strip()
-                if not content:
-                    return {"tasks": [], "categories": []}
-                
-                data = json.loads(content)
-                if "tasks" not in data:
-                    data["tasks"] = []
-                if "categories" not in data:
-                    data["categories"] = []
-                return data
-        else:
-            return {"tasks": [], "categories": []}
-    except json.JSONDecodeError:
-        if os.path.exists(DATA_FILE):
-            backup_name = f"{DATA_FILE}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            os.rename(DATA_FILE, backup_name)
-        return {"tasks": [], "categories": []}
-    except Exception:
-        return {"tasks": [], "categories": []}
+    return store.get()
 
-def save_data(data):
-    try:
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-    except Exception:
-        pass
+# Сериализация задач для ответа: category и overdue дописываются прямо в JSON задачи, без копии словаря
+def get_encoded_categories():
+    if encoded_categories["version"] != store.category_version:
+        encoded_categories["by_id"] = {
+            cat_id: codec.dumps(cat).decode("utf-8") for cat_id, cat in store.categories_by_id().items()
+        }
+        encoded_categories["version"] = store.category_version
+    return encoded_categories["by_id"]
+
+def encode_task(task, overdue, categories):
+    category = categories.get(task["category_id"], "null") if task.get("category_id") else "null"
+    encoded = codec.dumps(task).decode("utf-8")
+    return f'{encoded[:-1]},"category":{category},"overdue":{"true" if overdue else "false"}}}'
+
+def json_response(body, status=200):
+    return app.response_class(body, status=status, mimetype="application/json")
+
+# Большие списки отдаются потоком: задачи кодируются пачками, куски копятся до STREAM_BUFFER_SIZE и сразу уходят клиенту.
+# Память не растёт с числом задач, а первые байты приходят раньше, чем закодирован весь список
+STREAM_CHUNK_TASKS = 200
+STREAM_BUFFER_SIZE = 64 * 1024
+
+# Тело читается уже после выхода из обработчика, когда current_shard снова указывает на общий шард,
+# поэтому блокировку шарда (stream_lock()) обработчик берёт сам и передаёт в iter_task_list
+def stream_lock():
+    return current_shard.get().store.lock.shared
+
+def encode_task_chunks(tasks_with_overdue, categories, lock):
+    while True:
+        # Писатель может менять словари задач в соседнем потоке
+        with lock, metrics.timed("serialize"):
+            chunk = [encode_task(task, overdue, categories) for task, overdue in islice(tasks_with_overdue, STREAM_CHUNK_TASKS)]
+        if not chunk:
+            return
+        metrics.count("serialize", len(chunk))
+        yield from chunk
+
+def iter_task_list(tasks_with_overdue, categories, lock):
+    yield "["
+    for i, encoded in enumerate(encode_task_chunks(iter(tasks_with_overdue), categories, lock)):
+        yield ", " + encoded if i else encoded
+    yield "]"
+
+def buffered_chunks(pieces):
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= STREAM_BUFFER_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+def streamed_json_response(*parts, cache_key=None):
+    # Части — готовые строки или итераторы строк (iter_task_list); с cache_key дочитанное тело попадёт в кэш ответов
+    pieces = chain.from_iterable([part] if isinstance(part, str) else part for part in parts)
+    chunks = buffered_chunks(pieces)
+    if cache_key is not None:
+        shard = current_shard.get()
+        chunks = shard.response_cache.tee(shard.store, cache_key, chunks)
+    return app.response_class(chunks, mimetype="application/json")
+
+def cached_response(cache_key):
+    body = response_cache.get(cache_key)
+    return json_response(body) if body is not None else None
+
+def cache_json(cache_key, payload):
+    with metrics.timed("serialize"):
+        response = jsonify(payload)
+    response_cache.put(cache_key, response.get_data())
+    return response
+
+def streamed_ndjson_response(tasks_with_overdue, categories):
+    lines = (encoded + "\n" for encoded in encode_task_chunks(iter(tasks_with_overdue), categories, stream_lock()))
+    return app.response_class(buffered_chunks(lines), mimetype="application/x-ndjson")
 
-def is_task_overdue(task, today):
-    if task.get("completed"):
+# ETag ответа: поколение хранилища (общее для воркеров) и mtime файла (ручные правки),
+# плюс сегодняшняя дата для ответов, где от неё зависят разбивка и просрочка
+def data_etag(*parts):
+    # crc адреса с параметрами — чтобы ETag одной страницы не подошёл к другой
+    url_crc = zlib.crc32(request.full_path.encode("utf-8"))
+    return "-".join(str(part) for part in (store.generation or 0, store.mtime or 0, url_crc) + parts)
+
+def not_modified(etag):
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def task_sort_key(task):
+    return (
+        task.get("time") if task.get("time") else "99:99",
+        task["priority"] != "high",
+        isinstance(task["id"], str),
+        task["id"]
+    )
+
+# Изменение не записалось на диск (нет места, нет прав): клиент получает ошибку, а не 200 с потерянным изменением
+@app.errorhandler(PersistError)
+def persist_failed(error):
+    return jsonify({"error": "Failed to save changes"}), 500
+
+# Все изменения данных идут под блокировкой хранилища, чтобы параллельные запросы не перетирали друг друга
+def with_store_lock(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        with store.lock:
+            return f(*args, **kwargs)
+    return wrapper
+
+# Чтения — под общей блокировкой: идут параллельно друг другу и ждут только текущий запрос писателя.
+# Свежесть данных проверяется до входа — перечитать их под другими читателями уже нельзя
+def with_store_read_lock(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        store.get()
+        with store.lock.shared:
+            return f(*args, **kwargs)
+    return wrapper
+
+# Действие над виртуальным экземпляром сначала сохраняет его как обычную задачу, над архивной — возвращает
+# её в рабочий набор; дальше работает обычный обработчик
+def materialize_task_ref(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        task_id = kwargs.get("task_id")
+        if isinstance(task_id, VirtualTaskRef):
+            instance = materialize_occurrence(load_data(), task_id)
+            if instance is None:
+                return jsonify({"error": "Task not found"}), 404
+            kwargs["task_id"] = instance["id"]
+        else:
+            load_data()
+            if store.get_task(task_id) is None:
+                store.restore_archived(task_id)
+        return f(*args, **kwargs)
+    return wrapper
+
+# Проверки принимают TaskRecord (store.record(task)) — даты в нём уже разобраны
+def is_task_overdue(record, today):
+    if record.completed:
         return False
     
-    task_date_str = task.get("date") or task.get("created_at")
-    if not task_date_str:
+    if record.day is None:
         return False
     
-    try:
-        task_date = datetime.fromisoformat(task_date_str).date()
-        if task.get("original_task_id") is not None:
-            return task_date < today
-        return task_date < today
-    except Exception:
-        return False
+    return record.day < today
 
-def is_task_completed_today(task, today):
-    if not task.get("completed"):
+def is_task_completed_today(record, today):
+    if not record.completed:
         return False
     
-    completed_at = task.get("completed_at")
-    if not completed_at:
+    if record.completed_on != today:
         return False
     
-    try:
-        completed_date = datetime.fromisoformat(completed_at).date()
-        if completed_date != today:
-            return False
-        
-        task_date_str = task.get("date") or task.get("created_at")
-        if not task_date_str:
-            return False
-            
-        task_date = datetime.fromisoformat(task_date_str).date()
-        return task_date == today
-        
-    except Exception:
-        return False
+    return record.day == today
 
-def should_display_task_today(task, today):
-    if is_task_completed_today(task, today):
+def should_display_task_today(record, today):
+    if is_task_completed_today(record, today):
         return False
     
-    task_date_str = task.get("date") or task.get("created_at")
-    if not task_date_str:
+    if record.day is None:
         return False
     
-    try:
-        task_date = datetime.fromisoformat(task_date_str).date()
-    except Exception:
+    if record.original_task_id is None and record.repeat_interval not in [None, "none"]:
         return False
     
-    if task.get("original_task_id") is None and task.get("repeat_interval") not in [None, "none"]:
-        return False
-    
-    if task.get("original_task_id") is not None:
-        return task_date == today
-    
-    return task_date == today
+    return record.day == today
 
 def create_generated_task(template, task_date, new_id):
     new_task = template.copy()
     new_task["id"] = new_id
     new_task["completed"] = False
     new_task["completed_at"] = None
+    new_task["date"] = task_date.isoformat()
     new_task["created_at"] = task_date.isoformat()
     new_task["original_task_id"] = template["id"]
     new_task["repeat_interval"] = "none"
     new_task["repeat_days"] = None
     new_task["repeat_until"] = None
+    new_task.pop("skipped_dates", None)
     
     if "time" in template:
         new_task["time"] = template["time"]
     
     return new_task
 
-def generate_today_tasks_logic(data, today):
-    generated_count = 0
-    task_templates = [task for task in data["tasks"] 
-                     if task.get("repeat_interval") and 
-                     task.get("repeat_interval") != "none" and 
-                     task.get("original_task_id") is None]
-    
-    for template in task_templates:
-        should_generate = should_generate_task_today(template, today)
-        is_completed = is_task_completed_today(template, today)
+def templates_due_on(today, templates=None):
+    # Шаблоны (все или из templates), для которых на этот день пора создать экземпляр
+    if templates is None:
+        templates = store.recurring_templates()
+    for template in templates:
+        if template["id"] not in store.templates:
+            continue
+        template_record = store.record(template)
+        should_generate = should_generate_task_today(template_record, today)
+        is_completed = is_task_completed_today(template_record, today)
         
-        if should_generate and not is_completed:
-            task_exists = any(
-                t.get("original_task_id") == template["id"] and 
-                datetime.fromisoformat(t["created_at"]).date() == today
-                for t in data["tasks"]
-            )
-            
-            if not task_exists:
-                new_task = create_generated_task(template, today, len(data["tasks"]) + 1)
-                data["tasks"].append(new_task)
-                generated_count += 1
+        if should_generate and not is_completed and today not in template_record.skipped_dates:
+            if store.get_instance(template["id"], today) is None:
+                yield template
+
+def generate_today_tasks_logic(data, today, templates=None):
+    generated_tasks = []
+    with metrics.timed("generate"):
+        for template in list(templates_due_on(today, templates)):
+            new_task = create_generated_task(template, today, store.next_id())
+            data["tasks"].append(new_task)
+            generated_tasks.append(new_task)
+    metrics.count("generate", len(generated_tasks))
     
-    return generated_count
+    return generated_tasks
 
-def should_generate_task_today(task, today):
-    try:
-        task_created_date = datetime.fromisoformat(task["created_at"]).date()
-    except:
+# Экземпляры повторений на день создаёт фоновая ежедневная работа (Shard.daily_jobs), GET /tasks/ только читает.
+# Шаблон, созданный или изменённый после неё, получает сегодняшний экземпляр сразу, в том же запросе
+def materialize_today(tasks):
+    generated_tasks = generate_today_tasks_logic(load_data(), date.today(), tasks)
+    if generated_tasks:
+        store.commit("create", changed=generated_tasks)
+
+# Выполненные задачи старше горизонта раз в день переезжают в архив; 0 — не архивировать
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "180"))
+
+def run_daily_jobs(day, is_today):
+    generated_tasks = generate_today_tasks_logic(load_data(), day)
+    if generated_tasks:
+        store.commit("create", changed=generated_tasks)
+    if is_today:
+        if ARCHIVE_AFTER_DAYS > 0:
+            store.archive_completed(day - timedelta(days=ARCHIVE_AFTER_DAYS))
+        # Вчерашние ответы больше не нужны, даже если за ночь ничего не изменилось
+        response_cache.invalidate()
+
+def should_generate_task_today(record, today):
+    task_created_date = record.created
+    if task_created_date is None:
         return False
     
-    if task.get("repeat_until"):
-        try:
-            repeat_until = datetime.fromisoformat(task["repeat_until"]).date()
-            if today > repeat_until:
-                return False
-        except Exception:
-            pass
+    if record.repeat_until and today > record.repeat_until:
+        return False
     
-    if task["repeat_interval"] == "daily":
+    if record.repeat_interval == "daily":
         return today >= task_created_date
     
-    if task["repeat_interval"] == "weekly" and task.get("repeat_days"):
+    if record.repeat_interval == "weekly" and record.weekday_mask is not None:
         if today < task_created_date:
             return False
-        
-        repeat_days = []
-        try:
-            if isinstance(task["repeat_days"], str):
-                repeat_days = [int(day.strip()) for day in task["repeat_days"].split(",") if day.strip()]
-            elif isinstance(task["repeat_days"], list):
-                repeat_days = [int(day) for day in task["repeat_days"]]
-        except (ValueError, AttributeError):
-            return False
-        
-        current_weekday = today.weekday()
-        return current_weekday in repeat_days
+        return bool(record.weekday_mask >> today.weekday() & 1)
     
-    if task["repeat_interval"] == "monthly":
+    if record.repeat_interval == "monthly":
         if today < task_created_date:
             return False
         return today.day == task_created_date.day
     
     return task_created_date == today
 
+# Развёртка повторений: дни из [date_from, date_to], на которые шаблон порождает задачу.
+# Правило то же, что в should_generate_task_today, но без перебора дня за днём для monthly
+def expand_occurrences(record, date_from, date_to):
+    created = record.created
+    if created is None:
+        return
+    
+    if record.repeat_until and record.repeat_until < date_to:
+        date_to = record.repeat_until
+    
+    interval = record.repeat_interval
+    if interval == "monthly":
+        year, month = max(date_from, created).year, max(date_from, created).month
+        while True:
+            try:
+                day = date(year, month, created.day)
+            except ValueError:
+                day = None
+            if day is not None:
+                if day > date_to:
+                    return
+                if day >= date_from and day >= created:
+                    yield day
+            elif date(year, month, 1) > date_to:
+                return
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    
+    elif interval == "daily" or (interval == "weekly" and record.weekday_mask is not None):
+        day = max(date_from, created)
+        while day <= date_to:
+            if interval == "daily" or record.weekday_mask >> day.weekday() & 1:
+                yield day
+            day += timedelta(days=1)
+    
+    elif date_from <= created <= date_to:
+        yield created
+
+def virtual_task_id(template_id, day):
+    return f"template_{template_id}_{day.isoformat()}"
+
+def virtual_occurrences(date_from, date_to, today):
+    # Будущие экземпляры не хранятся: считаем их на лету и пропускаем дни, где экземпляр уже есть
+    # (выполнен, перенесён как исключение или создан генерацией) либо повтор отменён
+    date_from = max(date_from, today)
+    by_day = {}
+    if date_from > date_to:
+        return by_day
+    
+    for template in store.recurring_templates():
+        record = store.record(template)
+        for day in expand_occurrences(record, date_from, date_to):
+            if day in record.skipped_dates or store.get_instance(template["id"], day) is not None:
+                continue
+            if day == today and is_task_completed_today(record, today):
+                continue
+            virtual_task = create_generated_task(template, day, virtual_task_id(template["id"], day))
+            virtual_task["is_virtual"] = True
+            virtual_task["is_template_based"] = True
+            by_day.setdefault(day, []).append(virtual_task)
+    return by_day
+
+def occurrence_template(ref):
+    template = store.get_task(ref.template_id)
+    if template is None or not should_generate_task_today(store.record(template), ref.day):
+        return None
+    return template
+
+def materialize_occurrence(data, ref):
+    template = occurrence_template(ref)
+    if template is None:
+        return None
+    
+    instance = store.get_instance(template["id"], ref.day)
+    if instance is not None:
+        return instance
+    
+    instance = create_generated_task(template, ref.day, store.next_id())
+    data["tasks"].append(instance)
+    store.commit("create", changed=[instance])
+    return instance
+
 # Эндпоинты Flask
 @app.route('/')
 def home():
@@ -256,52 +639,243 @@ def home():
 def health_check():
     return jsonify({"status": "healthy", "message": "Task Tracker Server is running"})
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return app.response_class(metrics.REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@metrics.REGISTRY.collector
+def shard_metrics():
+    # Пользовательские шарды — одной суммой: серия на каждого пользователя раздула бы /metrics
+    user_list = user_shards.open_shards()
+    groups = [("default", [default_shard]), ("users", user_list)]
+    
+    def per_group(value):
+        return [({"shard": name}, sum(value(shard) for shard in shards)) for name, shards in groups]
+    
+    return [
+        ("task_tracker_store_tasks", "gauge", "Tasks in the working set of open stores",
+         per_group(lambda shard: shard.store.task_count())),
+        ("task_tracker_store_disk_bytes", "gauge", "Size of store files on disk (data, journal, archive)",
+         per_group(lambda shard: shard.store.disk_size())),
+        ("task_tracker_store_revision", "gauge", "Store revision, grows on every change and reload",
+         [({"shard": "default"}, default_shard.store.revision)]),
+        ("task_tracker_open_user_shards", "gauge", "User stores currently open in this process",
+         [({}, len(user_list))]),
+        ("task_tracker_response_cache_hits_total", "counter", "Responses served from the response cache",
+         per_group(lambda shard: shard.response_cache.hits)),
+        ("task_tracker_response_cache_misses_total", "counter", "Response cache lookups that missed",
+         per_group(lambda shard: shard.response_cache.misses)),
+    ]
+
+OTHER_DAYS_PAGE_SIZE = 100
+MAX_OTHER_DAYS_PAGE_SIZE = 1000
+
+def parse_other_days_cursor(value):
+    ordinal, task_id = value.split(".")
+    return int(ordinal), int(task_id)
+
+def other_days_page(today_ids, date_from, date_to, cursor, limit):
+    # Задачи вне сегодняшних списков: сначала поздние дни, внутри дня — по убыванию id, задачи без даты — в конце.
+    # Курсор — «день.id» последней отданной задачи; обходим индекс дней, не перебирая и не сериализуя всё подряд
+    days = sorted((day for day in store.by_day
+                   if day is not None and (date_from is None or day >= date_from) and (date_to is None or day <= date_to)),
+                  reverse=True)
+    if date_from is None and date_to is None and None in store.by_day:
+        days.append(None)
+    
+    page = []
+    next_cursor = None
+    for day in days:
+        ordinal = day.toordinal() if day else 0
+        if cursor and ordinal > cursor[0]:
+            continue
+        day_tasks = store.by_day[day]
+        for task_id in sorted(day_tasks, reverse=True):
+            if cursor and ordinal == cursor[0] and task_id >= cursor[1]:
+                continue
+            if task_id in today_ids:
+                continue
+            if len(page) == limit:
+                return page, next_cursor
+            page.append(day_tasks[task_id])
+            next_cursor = f"{ordinal}.{task_id}"
+    return page, None
+
 @app.route('/tasks/', methods=['GET'])
+@with_store_read_lock
 def get_tasks():
-    data = load_data()
+    load_data()
     today = date.today()
     
-    generated_count = generate_today_tasks_logic(data, today)
-    if generated_count > 0:
-        save_data(data)
+    # other_from / other_to — окно дат, other_cursor / other_limit — страница списка other_days
+    try:
+        other_from = datetime.fromisoformat(request.args["other_from"]).date() if request.args.get("other_from") else None
+        other_to = datetime.fromisoformat(request.args["other_to"]).date() if request.args.get("other_to") else None
+        cursor = parse_other_days_cursor(request.args["other_cursor"]) if request.args.get("other_cursor") else None
+        limit = int(request.args.get("other_limit", OTHER_DAYS_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "other_from/other_to must be ISO dates, other_cursor a cursor from other_days_next, other_limit a number"}), 400
+    if not 0 < limit <= MAX_OTHER_DAYS_PAGE_SIZE:
+        return jsonify({"error": f"other_limit must be between 1 and {MAX_OTHER_DAYS_PAGE_SIZE}"}), 400
+    
+    etag = data_etag(today)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    cache_key = response_cache.key(store, request.full_path, today)
+    cached = cached_response(cache_key)
+    if cached:
+        return with_etag(cached, etag)
     
     today_active = []
     today_completed = []
-    other_days = []
     
-    for task in data["tasks"]:
-        category = None
-        if task.get("category_id") and "categories" in data:
-            category = next((cat for cat in data["categories"] if cat["id"] == task["category_id"]), None)
-        
-        task_with_category = task.copy()
-        task_with_category["category"] = category
-        task_with_category["overdue"] = is_task_overdue(task, today)
+    # Только задачи на сегодня — по индексу дней, а не перебором всех; порядок — как в списке задач (по id)
+    for task in sorted(store.tasks_on(today), key=lambda t: t["id"]):
+        record = store.record(task)
+        task_with_category = (task, is_task_overdue(record, today))
         
-        is_completed_today = is_task_completed_today(task, today)
-        should_display_today = should_display_task_today(task, today)
+        is_completed_today = is_task_completed_today(record, today)
+        should_display_today = should_display_task_today(record, today)
         
         if is_completed_today:
             today_completed.append(task_with_category)
         elif should_display_today and not task.get("completed"):
             today_active.append(task_with_category)
-        else:
-            other_days.append(task_with_category)
     
-    today_active.sort(key=lambda x: (
-        x.get("time") if x.get("time") else "99:99",
-        x["priority"] != "high",
-        x["id"]
-    ))
+    today_active.sort(key=lambda x: task_sort_key(x[0]))
+    
+    today_ids = {task["id"] for task, _ in today_active} | {task["id"] for task, _ in today_completed}
+    other_tasks, next_cursor = other_days_page(today_ids, other_from, other_to, cursor, limit)
+    other_days = [(task, is_task_overdue(store.record(task), today)) for task in other_tasks]
+    
+    categories = get_encoded_categories()
+    lock = stream_lock()
+    return with_etag(streamed_json_response(
+        '{"today_active": ', iter_task_list(today_active, categories, lock),
+        ', "today_completed": ', iter_task_list(today_completed, categories, lock),
+        ', "other_days": ', iter_task_list(other_days, categories, lock),
+        ', "other_days_next": ' + json.dumps(next_cursor) +
+        ', "revision": ' + str(store.generation or 0) + '}',
+        cache_key=cache_key
+    ), etag)
+
+# Дельта-синхронизация: только задачи, созданные, изменённые или удалённые после поколения since.
+# Если журнал изменений этого не покрывает (давно не синхронизировались, перезапуск), отдаём все задачи с reset: true
+@app.route('/tasks/changes', methods=['GET'])
+@with_store_read_lock
+def get_task_changes():
+    data = load_data()
+    today = date.today()
     
-    return jsonify({
-        "today_active": today_active,
-        "today_completed": today_completed,
-        "other_days": other_days
-    })
+    try:
+        since = int(request.args["since"])
+    except (KeyError, ValueError):
+        return jsonify({"error": "Query parameter 'since' must be a revision number"}), 400
+    
+    changes = change_log.since(store, since)
+    reset = changes is None
+    if reset:
+        changed_tasks = list(data["tasks"])
+        deleted_ids = []
+    else:
+        changed_tasks = [store.get_task(task_id) for task_id in changes if store.get_task(task_id) is not None]
+        deleted_ids = [task_id for task_id in changes if store.get_task(task_id) is None]
+    
+    changed = [(task, is_task_overdue(store.record(task), today)) for task in changed_tasks]
+    return streamed_json_response(
+        '{"revision": ' + str(store.generation or 0) +
+        ', "reset": ' + ("true" if reset else "false") +
+        ', "changed": ', iter_task_list(changed, get_encoded_categories(), stream_lock()),
+        ', "deleted": ' + json.dumps(deleted_ids) + '}'
+    )
+
+# Выгрузка всей истории, включая архив: по умолчанию NDJSON (задача на строку), format=json — JSON-массив.
+# from/to ограничивают выгрузку по дате задачи; задачи без даты попадают только в выгрузку без фильтра
+@app.route('/tasks/export', methods=['GET'])
+def export_tasks():
+    load_data()
+    today = date.today()
+    
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in ("ndjson", "json"):
+        return jsonify({"error": "format must be one of: ndjson, json"}), 400
+    try:
+        date_from = datetime.fromisoformat(request.args["from"]).date() if request.args.get("from") else None
+        date_to = datetime.fromisoformat(request.args["to"]).date() if request.args.get("to") else None
+    except ValueError:
+        return jsonify({"error": "Query parameters 'from' and 'to' must be ISO dates"}), 400
+    
+    with store.lock.shared:
+        records = list(chain((store.record(task) for task in store.data["tasks"]), store.archived_records()))
+    if date_from or date_to:
+        records = [r for r in records if r.day is not None and (date_from is None or r.day >= date_from)
+                   and (date_to is None or r.day <= date_to)]
+    
+    # Задачи размечаем по ходу выгрузки, а не списком заранее
+    tasks = ((record.task, is_task_overdue(record, today)) for record in records)
+    categories = get_encoded_categories()
+    if export_format == "json":
+        return streamed_json_response(iter_task_list(tasks, categories, stream_lock()))
+    return streamed_ndjson_response(tasks, categories)
+
+SEARCH_PAGE_SIZE = 50
+MAX_SEARCH_PAGE_SIZE = 500
+
+# Поиск по названию и описанию: находятся задачи, где каждое слово q — начало какого-то слова задачи.
+# category_id и from/to сужают выдачу; порядок и курсор — как у other_days (поздние дни первыми).
+# Архив не индексируется: ищем среди задач рабочего набора
+@app.route('/tasks/search', methods=['GET'])
+def search_tasks():
+    load_data()
+    today = date.today()
+    
+    query = request.args.get("q", "")
+    if not tokenize(query):
+        return jsonify({"error": "Query parameter 'q' must contain at least one word"}), 400
+    try:
+        category_id = int(request.args["category_id"]) if request.args.get("category_id") else None
+        date_from = datetime.fromisoformat(request.args["from"]).date() if request.args.get("from") else None
+        date_to = datetime.fromisoformat(request.args["to"]).date() if request.args.get("to") else None
+        cursor = parse_other_days_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+        limit = int(request.args.get("limit", SEARCH_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "category_id must be a number, from/to ISO dates, cursor a cursor from next, limit a number"}), 400
+    if not 0 < limit <= MAX_SEARCH_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_SEARCH_PAGE_SIZE}"}), 400
+    
+    etag = data_etag(today)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    with store.lock.shared:
+        records = [store.records[task_id] for task_id in search_index.search(query) if task_id in store.records]
+    if category_id is not None:
+        records = [r for r in records if r.task.get("category_id") == category_id]
+    if date_from or date_to:
+        records = [r for r in records if r.day is not None and (date_from is None or r.day >= date_from)
+                   and (date_to is None or r.day <= date_to)]
+    total = len(records)
+    
+    keys = sorted(((r.day_ordinal or 0, r.id), r) for r in records)
+    if cursor:
+        keys = keys[:bisect_left(keys, (cursor,))]
+    page = keys[::-1][:limit]
+    next_cursor = None
+    if len(keys) > limit:
+        ordinal, task_id = page[-1][0]
+        next_cursor = f"{ordinal}.{task_id}"
+    
+    tasks = ((record.task, is_task_overdue(record, today)) for _, record in page)
+    return with_etag(streamed_json_response(
+        '{"tasks": ', iter_task_list(tasks, get_encoded_categories(), stream_lock()),
+        f', "total": {total}, "next": {json.dumps(next_cursor)}}}'
+    ), etag)
 
 @app.route('/tasks/', methods=['POST'])
 @validate_json(TaskCreate)
+@with_store_lock
 def create_task(task: TaskCreate):
     data = load_data()
     today = date.today()
@@ -321,7 +895,7 @@ def create_task(task: TaskCreate):
             task_date = today
     
     new_task = {
-        "id": int(datetime.now().timestamp()),
+        "id": store.next_id(),
         "title": task.title,
         "description": task.description,
         "category_id": category_id,
@@ -340,16 +914,19 @@ def create_task(task: TaskCreate):
     }
     
     data["tasks"].append(new_task)
-    save_data(data)
+    store.commit("create", changed=[new_task])
+    materialize_today([new_task])
     
     return jsonify(new_task), 201
 
-@app.route('/tasks/<int:task_id>/move', methods=['PUT'])
+@app.route('/tasks/<task_ref:task_id>/move', methods=['PUT'])
 @validate_json(TaskDateUpdate)
+@with_store_lock
+@materialize_task_ref
 def move_task_to_date(date_update: TaskDateUpdate, task_id: int):
     data = load_data()
     
-    task = next((t for t in data["tasks"] if t["id"] == task_id), None)
+    task = store.get_task(task_id)
     if not task:
         return jsonify({"error": "Task not found"}), 404
     
@@ -369,16 +946,19 @@ def move_task_to_date(date_update: TaskDateUpdate, task_id: int):
     except Exception as e:
         return jsonify({"error": f"Invalid date format: {str(e)}"}), 400
     
-    save_data(data)
+    store.commit("move", changed=[task])
+    materialize_today([task])
     return jsonify(task)
 
-@app.route('/tasks/<int:task_id>', methods=['PUT'])
+@app.route('/tasks/<task_ref:task_id>', methods=['PUT'])
 @validate_json(TaskUpdate)
+@with_store_lock
+@materialize_task_ref
 def update_task(task_update: TaskUpdate, task_id: int):
-    data = load_data()
+    load_data()
     today = date.today()
     
-    task = next((t for t in data["tasks"] if t["id"] == task_id), None)
+    task = store.get_task(task_id)
     if not task:
         return jsonify({"error": "Task not found"}), 404
     
@@ -398,166 +978,235 @@ def update_task(task_update: TaskUpdate, task_id: int):
     task["repeat_days"] = task_update.repeat_days
     task["repeat_until"] = task_update.repeat_until
     
+    removed_ids = []
     if task.get("original_task_id") is None:
-        generated_tasks = [t for t in data["tasks"] if t.get("original_task_id") == task_id]
-        
-        for generated_task in generated_tasks:
-            generated_date = datetime.fromisoformat(generated_task["created_at"]).date()
-            
-            temp_task = generated_task.copy()
-            temp_task["repeat_interval"] = task_update.repeat_interval.value
-            temp_task["repeat_days"] = task_update.repeat_days
-            temp_task["repeat_until"] = task_update.repeat_until
-            
-            should_display = should_task_display_today_after_update(temp_task, generated_date)
-            
-            if not should_display:
-                data["tasks"] = [t for t in data["tasks"] if t["id"] != generated_task["id"]]
-    
-    save_data(data)
+        # Экземпляры, которых новое правило повтора больше не порождает, — по индексу дней шаблона,
+        # затем одно удаление всех сразу
+        rule = TaskRecord(task)
+        stale_ids = [instance_id for day, instance_id in store.instance_days(task_id).items()
+                     if not instance_survives_update(rule, day)]
+        removed_ids = store.remove_tasks(stale_ids)
+    
+    store.commit("update", changed=[task], deleted=removed_ids)
+    materialize_today([task])
     return jsonify(task)
 
-@app.route('/tasks/<int:task_id>/complete', methods=['PUT'])
+@app.route('/tasks/<task_ref:task_id>/complete', methods=['PUT'])
+@with_store_lock
+@materialize_task_ref
 def complete_task(task_id: int):
     data = load_data()
-    today = date.today()
     
-    task = next((t for t in data["tasks"] if t["id"] == task_id), None)
+    task = store.get_task(task_id)
     if not task:
         return jsonify({"error": "Task not found"}), 404
     
     task["completed"] = True
     task["completed_at"] = datetime.now().isoformat()
     
-    original_task_id = task.get("original_task_id")
-    if original_task_id:
-        original_task = next((t for t in data["tasks"] if t["id"] == original_task_id), None)
-        if original_task and should_create_next_task(original_task, today):
-            create_next_repeated_task(data, original_task, today)
-    else:
-        if task.get("repeat_interval") != "none" and should_create_next_task(task, today):
-            create_next_repeated_task(data, task, today)
-    
-    save_data(data)
+    # Следующий экземпляр заранее не создаём: календарь показывает его виртуально
+    store.commit("complete", changed=[task])
     return jsonify(task)
 
-def should_create_next_task(task, current_date):
-    if task.get("repeat_interval") == "none":
-        return False
-    
-    if task.get("repeat_until"):
-        try:
-            repeat_until = datetime.fromisoformat(task["repeat_until"]).date()
-            if current_date >= repeat_until:
-                return False
-        except Exception:
-            pass
-    
-    return True
-
-def create_next_repeated_task(data, original_task, current_date):
-    next_date = calculate_next_date(current_date, original_task)
-    if not next_date:
-        return
-    
-    task_exists = any(
-        t.get("original_task_id") == original_task["id"] and 
-        datetime.fromisoformat(t["created_at"]).date() == next_date
-        for t in data["tasks"]
-    )
-    
-    if task_exists:
-        return
-    
-    new_task = create_generated_task(original_task, next_date, len(data["tasks"]) + 1)
-    data["tasks"].append(new_task)
-
-def calculate_next_date(current_date, task):
-    repeat_interval = task.get("repeat_interval")
-    
-    if repeat_interval == "daily":
-        return current_date + timedelta(days=1)
-    
-    elif repeat_interval == "weekly" and task.get("repeat_days"):
-        current_weekday = current_date.weekday()
-        repeat_days = []
-        try:
-            repeat_days = [int(day.strip()) for day in task["repeat_days"].split(",") if day.strip()]
-        except (ValueError, AttributeError):
-            return None
-        
-        for day_offset in range(1, 8):
-            next_date = current_date + timedelta(days=day_offset)
-            if next_date.weekday() in repeat_days:
-                return next_date
-    
-    elif repeat_interval == "monthly":
-        next_month = current_date.replace(day=28) + timedelta(days=4)
-        return next_month.replace(day=min(current_date.day, [31,29,31,30,31,30,31,31,30,31,30,31][next_month.month-1]))
-    
-    return None
-
-@app.route('/tasks/<int:task_id>/uncomplete', methods=['PUT'])
+@app.route('/tasks/<task_ref:task_id>/uncomplete', methods=['PUT'])
+@with_store_lock
+@materialize_task_ref
 def uncomplete_task(task_id: int):
     data = load_data()
     today = date.today()
     
-    task = next((t for t in data["tasks"] if t["id"] == task_id), None)
+    task = store.get_task(task_id)
     if not task:
         return jsonify({"error": "Task not found"}), 404
     
     task["completed"] = False
     task["completed_at"] = None
     
+    changed = [task]
+    deleted = []
     original_task_id = task.get("original_task_id")
     if original_task_id:
-        original_task = next((t for t in data["tasks"] if t["id"] == original_task_id), None)
-        if original_task and should_display_task_today(original_task, today):
+        original_task = store.get_task(original_task_id)
+        if original_task and should_display_task_today(store.record(original_task), today):
             data["tasks"] = [t for t in data["tasks"] if t["id"] != task_id]
-            new_task = create_generated_task(original_task, today, len(data["tasks"]) + 1)
+            new_task = create_generated_task(original_task, today, store.next_id())
             data["tasks"].append(new_task)
+            changed = [new_task]
+            deleted = [task_id]
     
-    save_data(data)
+    store.commit("uncomplete", changed=changed, deleted=deleted)
+    materialize_today(changed)
     return jsonify(task)
 
-@app.route('/tasks/<int:task_id>', methods=['DELETE'])
+@app.route('/tasks/<task_ref:task_id>', methods=['DELETE'])
+@with_store_lock
 def delete_task(task_id: int):
-    data = load_data()
-    
+    load_data()
+    
+    if isinstance(task_id, VirtualTaskRef):
+        # Удаление виртуального экземпляра — исключение для одного дня: запоминаем день в шаблоне
+        template = occurrence_template(task_id)
+        if template is None:
+            return jsonify({"error": "Task not found"}), 404
+        template["skipped_dates"] = sorted(set(template.get("skipped_dates") or []) | {task_id.day.isoformat()})
+        store.commit("update", changed=[template])
+        return jsonify({"message": "Task deleted"})
+    
+    deleted = []
     if task_id:
-        data["tasks"] = [t for t in data["tasks"] if t["id"] != task_id and t.get("original_task_id") != task_id]
+        if task_id in store.templates:
+            # Вместе с шаблоном уходят и его экземпляры из архива
+            store.drop_archived([r.id for r in store.archived_records() if r.original_task_id == task_id])
+        else:
+            store.delete_archived(task_id)
+        # Задача и её экземпляры — одним проходом
+        deleted = store.remove_tasks([task_id], template_id=task_id)
     
-    save_data(data)
+    store.commit("delete", deleted=deleted)
     return jsonify({"message": "Task deleted"})
 
+MAX_BATCH_OPERATIONS = 1000
+
+# Обработчики одиночных запросов; у validate_json-обработчиков берём функцию под декоратором — модель проверяем сами
+BATCH_HANDLERS = {
+    BatchOp.CREATE: (TaskCreate, lambda task, task_id: create_task.__wrapped__(task)),
+    BatchOp.UPDATE: (TaskUpdate, lambda task, task_id: update_task.__wrapped__(task, task_id=task_id)),
+    BatchOp.MOVE: (TaskDateUpdate, lambda task, task_id: move_task_to_date.__wrapped__(task, task_id=task_id)),
+    BatchOp.COMPLETE: (None, lambda task, task_id: complete_task(task_id=task_id)),
+    BatchOp.UNCOMPLETE: (None, lambda task, task_id: uncomplete_task(task_id=task_id)),
+    BatchOp.DELETE: (None, lambda task, task_id: delete_task(task_id=task_id)),
+}
+
+class BatchOperationFailed(Exception):
+    def __init__(self, index, message, status):
+        super().__init__(message)
+        self.index = index
+        self.message = message
+        self.status = status
+
+def prepare_batch_operation(operation, known_ids):
+    # ((модель, id), None) или (None, (ошибка, статус)). known_ids — id, которые будут существовать к этому шагу
+    model, _ = BATCH_HANDLERS[operation.op]
+    task = None
+    if model is not None:
+        try:
+            task = model(**(operation.task or {}))
+        except Exception as e:
+            return None, (str(e), 400)
+    if operation.op == BatchOp.MOVE:
+        try:
+            datetime.fromisoformat(task.date)
+        except ValueError as e:
+            return None, (f"Invalid date format: {str(e)}", 400)
+    if operation.op == BatchOp.CREATE:
+        return (task, None), None
+    
+    try:
+        task_id = TaskRefConverter(app.url_map).to_python(str(operation.id))
+    except ValueError:
+        return None, ("Task not found", 404)
+    if isinstance(task_id, VirtualTaskRef):
+        if occurrence_template(task_id) is None:
+            return None, ("Task not found", 404)
+    elif operation.op == BatchOp.DELETE:
+        # Удаление шаблона уносит и его экземпляры
+        known_ids.discard(task_id)
+        known_ids.difference_update(t["id"] for t in store.tasks_for_template(task_id))
+    elif task_id not in known_ids and not store.is_archived(task_id):
+        # Архивную задачу обработчик вернёт в рабочий набор (materialize_task_ref)
+        return None, ("Task not found", 404)
+    return (task, task_id), None
+
+# Пачка операций одним запросом (синхронизация после офлайна, импорт плана привычек).
+# Сначала проверяются все операции — при любой ошибке не применяется ни одна; затем они применяются
+# по порядку в памяти, и на диск всё пишется один раз. Ошибка на этапе применения откатывает всю пачку
+@app.route('/tasks/batch', methods=['POST'])
+@validate_json(TaskBatch)
+@with_store_lock
+def batch_tasks(batch: TaskBatch):
+    load_data()
+    
+    if len(batch.operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({"error": f"Batch is limited to {MAX_BATCH_OPERATIONS} operations"}), 400
+    
+    known_ids = set(store.by_id)
+    prepared = []
+    for index, operation in enumerate(batch.operations):
+        arguments, error = prepare_batch_operation(operation, known_ids)
+        if error:
+            message, status = error
+            return jsonify({"error": message, "index": index}), status
+        prepared.append((operation.op, arguments))
+    
+    results = []
+    try:
+        with store.savepoint():
+            for index, (op, (task, task_id)) in enumerate(prepared):
+                _, handler = BATCH_HANDLERS[op]
+                response = handler(task, task_id)
+                response, status = response if isinstance(response, tuple) else (response, response.status_code)
+                if status >= 400:
+                    # Зависимость между операциями, которую не видно заранее (например, удалённый выше шаблон):
+                    # откатываем уже применённые операции пачки
+                    raise BatchOperationFailed(index, response.get_json()["error"], status)
+                results.append({"op": op.value, "status": status, "body": response.get_json()})
+    except BatchOperationFailed as failure:
+        return jsonify({"error": failure.message, "index": failure.index}), failure.status
+    
+    return jsonify({"results": results})
+
+STATS_GROUP_BY = ("day", "week", "category")
+MAX_STATS_RANGE_DAYS = 3660
+
+# Колоночный движок статистики по всей истории: строится один раз на ревизию хранилища (stats_engine_cache шарда)
+def get_stats_engine():
+    # Два читателя могут собрать движок одновременно — результат одинаковый; ревизию пишем после движка
+    with store.lock.shared:
+        if stats_engine_cache["revision"] != store.revision:
+            stats_engine_cache["engine"] = StatsEngine(chain(store.records.values(), store.archived_records()))
+            stats_engine_cache["revision"] = store.revision
+        return stats_engine_cache["engine"]
+
+@app.route('/stats', methods=['GET'])
 @app.route('/stats/', methods=['GET'])
 def get_stats():
-    data = load_data()
+    load_data()
     today = date.today()
     
-    today_tasks = [t for t in data["tasks"] if should_display_task_today(t, today) or is_task_completed_today(t, today)]
+    cache_key = response_cache.key(store, request.full_path, today)
+    cached = cached_response(cache_key)
+    if cached:
+        return cached
     
-    completed_today = len([t for t in today_tasks if is_task_completed_today(t, today)])
-    total_tasks = len(today_tasks)
+    if not any(key in request.args for key in ("from", "to", "group_by")):
+        # Статистика за сегодня: задачи «на сегодня» всегда датированы сегодняшним днём
+        today_columns = StatsColumns((store.record(t) for t in store.tasks_on(today)), same_day=True)
+        return cache_json(cache_key, today_columns.summarize_range(today, today))
     
-    high_priority = len([t for t in today_tasks if t["priority"] == "high"])
-    medium_priority = len([t for t in today_tasks if t["priority"] == "medium"])
-    low_priority = len([t for t in today_tasks if t["priority"] == "low"])
+    try:
+        date_from = datetime.fromisoformat(request.args.get("from") or today.isoformat()).date()
+        date_to = datetime.fromisoformat(request.args.get("to") or today.isoformat()).date()
+    except Exception:
+        return jsonify({"error": "Query parameters 'from' and 'to' must be ISO dates"}), 400
     
-    total_time = sum(t.get("estimated_time", 0) for t in today_tasks)
-    completed_time = sum(t.get("estimated_time", 0) for t in today_tasks if is_task_completed_today(t, today))
+    group_by = request.args.get("group_by")
+    if group_by is not None and group_by not in STATS_GROUP_BY:
+        return jsonify({"error": f"group_by must be one of: {', '.join(STATS_GROUP_BY)}"}), 400
+    if date_to < date_from:
+        return jsonify({"error": "'to' must not be earlier than 'from'"}), 400
+    if (date_to - date_from).days >= MAX_STATS_RANGE_DAYS:
+        return jsonify({"error": f"Range is limited to {MAX_STATS_RANGE_DAYS} days"}), 400
     
-    return jsonify({
-        "total_tasks": total_tasks,
-        "completed_tasks": completed_today,
-        "completion_rate": (completed_today / total_tasks * 100) if total_tasks > 0 else 0,
-        "high_priority": high_priority,
-        "medium_priority": medium_priority,
-        "low_priority": low_priority,
-        "total_time_minutes": total_time,
-        "completed_time_minutes": completed_time,
-        "time_completion_rate": (completed_time / total_time * 100) if total_time > 0 else 0
-    })
+    return cache_json(cache_key, get_stats_engine().report(date_from, date_to, group_by))
+
+@app.route('/habits/<int:template_id>/stats', methods=['GET'])
+@with_store_read_lock
+def get_habit_stats(template_id: int):
+    load_data()
+    summary = habit_stats.summary(template_id, date.today())
+    if summary is None:
+        return jsonify({"error": "Habit not found"}), 404
+    return jsonify(summary)
 
 @app.route('/categories/', methods=['GET'])
 def get_categories():
@@ -565,17 +1214,23 @@ def get_categories():
         data = load_data()
         
         if "categories" not in data or not data["categories"]:
-            data["categories"] = [
-                {"id": 1, "name": "Работа", "color": "#3B82F6", "icon": "💼"},
-                {"id": 2, "name": "Личное", "color": "#10B981", "icon": "🏠"},
-                {"id": 3, "name": "Здоровье", "color": "#EF4444", "icon": "💊"},
-                {"id": 4, "name": "Обучение", "color": "#8B5CF6", "icon": "📚"},
-                {"id": 5, "name": "Отдых", "color": "#F59E0B", "icon": "🎮"},
-                {"id": 6, "name": "Спорт", "color": "#470027", "icon": "🏃"}
-            ]
-            save_data(data)
+            # Категории по умолчанию создаются один раз — только тогда чтению нужна блокировка записи
+            with store.lock:
+                data = load_data()
+                if "categories" not in data or not data["categories"]:
+                    data["categories"] = [
+                        {"id": 1, "name": "Работа", "color": "#3B82F6", "icon": "💼"},
+                        {"id": 2, "name": "Личное", "color": "#10B981", "icon": "🏠"},
+                        {"id": 3, "name": "Здоровье", "color": "#EF4444", "icon": "💊"},
+                        {"id": 4, "name": "Обучение", "color": "#8B5CF6", "icon": "📚"},
+                        {"id": 5, "name": "Отдых", "color": "#F59E0B", "icon": "🎮"},
+                        {"id": 6, "name": "Спорт", "color": "#470027", "icon": "🏃"}
+                    ]
+                    store.commit("category", categories=True)
         
-        return jsonify(data["categories"])
+        with store.lock.shared:
+            etag = data_etag()
+            return not_modified(etag) or with_etag(jsonify(data["categories"]), etag)
     except Exception:
         return jsonify([
             {"id": 1, "name": "Работа", "color": "#3B82F6", "icon": "💼"},
@@ -588,6 +1243,7 @@ def get_categories():
 
 @app.route('/categories/', methods=['POST'])
 @validate_json(CategoryCreate)
+@with_store_lock
 def create_category(category: CategoryCreate):
     data = load_data()
     
@@ -602,7 +1258,7 @@ def create_category(category: CategoryCreate):
     }
     
     data["categories"].append(new_category)
-    save_data(data)
+    store.commit("category", categories=True)
     
     return jsonify(new_category), 201
 
@@ -616,46 +1272,83 @@ def get_calendar_tasks(date_str: str):
     except Exception:
         target_date = date.today()
     
-    tasks_for_date = []
+    etag = data_etag(today)
+    cached = not_modified(etag)
+    if cached:
+        return cached
     
-    for task in data["tasks"]:
-        if task.get("is_exception"):
-            task_date_str = task.get("date") or task.get("created_at")
-        else:
-            task_date_str = task.get("date") or task.get("created_at")
-        
-        if not task_date_str:
-            continue
-        
-        try:
-            task_date = datetime.fromisoformat(task_date_str).date()
-        except Exception:
-            continue
-        
-        if task_date == target_date:
-            category = None
-            if task.get("category_id") and "categories" in data:
-                category = next((cat for cat in data["categories"] if cat["id"] == task["category_id"]), None)
-            
-            task_with_category = task.copy()
-            task_with_category["category"] = category
-            task_with_category["overdue"] = task_date < today and not task.get("completed")
-            tasks_for_date.append(task_with_category)
-    
-    tasks_for_date.sort(key=lambda x: (
-        x.get("time") if x.get("time") else "99:99",
-        x["priority"] != "high",
-        x["id"]
-    ))
+    tasks = (store.tasks_on(target_date) + store.archived_between(target_date, target_date) +
+             virtual_occurrences(target_date, target_date, today).get(target_date, []))
+    tasks_for_date = calendar_entries(tasks, target_date, today)
     
-    return jsonify({"date": date_str, "tasks": tasks_for_date})
+    return with_etag(streamed_json_response(
+        '{"date": ' + json.dumps(date_str, ensure_ascii=False) +
+        ', "tasks": ', iter_task_list(tasks_for_date, get_encoded_categories(), stream_lock()), '}'
+    ), etag)
+
+MAX_CALENDAR_RANGE_DAYS = 400
 
-def should_task_display_today_after_update(task, today):
-    if task.get("repeat_interval") in [None, "none"]:
-        task_date = datetime.fromisoformat(task["created_at"]).date()
-        return task_date == today
+# Весь месяц (или любой диапазон) одним запросом: задачи разложены по дням
+@app.route('/calendar', methods=['GET'])
+def get_calendar_range():
+    load_data()
+    today = date.today()
     
-    return should_generate_task_today(task, today)
+    try:
+        date_from = datetime.fromisoformat(request.args["from"]).date()
+        date_to = datetime.fromisoformat(request.args["to"]).date()
+    except Exception:
+        return jsonify({"error": "Query parameters 'from' and 'to' must be ISO dates"}), 400
+    
+    if date_to < date_from:
+        return jsonify({"error": "'to' must not be earlier than 'from'"}), 400
+    if (date_to - date_from).days >= MAX_CALENDAR_RANGE_DAYS:
+        return jsonify({"error": f"Range is limited to {MAX_CALENDAR_RANGE_DAYS} days"}), 400
+    
+    etag = data_etag(today)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    days = {}
+    current = date_from
+    while current <= date_to:
+        days[current] = []
+        current += timedelta(days=1)
+    
+    for task in store.tasks_between(date_from, date_to):
+        days[store.record(task).day].append(task)
+    for task in store.archived_between(date_from, date_to):
+        days[task_day(task)].append(task)
+    for day, virtual_tasks in virtual_occurrences(date_from, date_to, today).items():
+        days[day].extend(virtual_tasks)
+    
+    categories = get_encoded_categories()
+    lock = stream_lock()
+    
+    def iter_days():
+        for i, (day, tasks) in enumerate(days.items()):
+            yield (', ' if i else '') + json.dumps(day.isoformat()) + ': '
+            yield from iter_task_list(calendar_entries(tasks, day, today), categories, lock)
+    
+    return with_etag(streamed_json_response(
+        '{"from": ' + json.dumps(date_from.isoformat()) +
+        ', "to": ' + json.dumps(date_to.isoformat()) +
+        ', "days": {', iter_days(), '}}'
+    ), etag)
+
+def calendar_entries(tasks, day, today):
+    entries = [(task, day < today and not task.get("completed")) for task in tasks]
+    entries.sort(key=lambda x: task_sort_key(x[0]))
+    return entries
+
+def instance_survives_update(rule, day):
+    # Остаётся ли экземпляр, созданный на день day, при новых настройках повтора шаблона (rule — его запись).
+    # Правило то же, что при генерации: дата создания шаблона, repeat_until, дни недели и число месяца;
+    # без повтора остаётся только экземпляр дня создания. Даты уже разобраны в индексе — без копий задач
+    if day is None:
+        return False
+    return should_generate_task_today(rule, day)
 
 def check_task_time_for_notification(task, current_time):
     if not task.get("time") or task.get("completed"):
@@ -686,8 +1379,8 @@ def check_notifications():
     
     notifications = []
     
-    for task in data["tasks"]:
-        if (should_display_task_today(task, today) and 
+    for task in store.tasks_on(today):
+        if (should_display_task_today(store.record(task), today) and 
             not task.get("completed") and
             check_task_time_for_notification(task, now)):
             
@@ -701,6 +1394,39 @@ def check_notifications():
     
     return jsonify({"notifications": notifications})
 
+MAX_NOTIFICATION_WAIT_SECONDS = 55
+
+def notification_cursor():
+    value = request.headers.get("Last-Event-ID") or request.args.get("since")
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+# Long-poll: ответ приходит, как только сработает напоминание, или пустым по таймауту
+@app.route('/notifications/poll', methods=['GET'])
+def poll_notifications():
+    load_data()
+    try:
+        timeout = min(float(request.args.get("timeout", 25)), MAX_NOTIFICATION_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({"error": "Query parameter 'timeout' must be a number of seconds"}), 400
+    
+    notifications, last_event_id = notification_scheduler.wait(notification_cursor(), max(timeout, 0))
+    return jsonify({"notifications": notifications, "last_event_id": last_event_id})
+
+@app.route('/notifications/stream', methods=['GET'])
+def stream_notifications():
+    load_data()
+    return app.response_class(
+        sse_events(current_shard.get().notification_scheduler, notification_cursor()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Ежедневная работа: при запуске догоняем пропущенные дни, дальше — фоновый поток шарда, просыпающийся в полночь
+default_shard.daily_jobs.run_pending()
+
 # WSGI application для PythonAnywhere
 application = app
 
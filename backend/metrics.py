@@ -0,0 +1,127 @@
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# Метрики в памяти процесса в текстовом формате Prometheus (без prometheus_client).
+# У каждого воркера gunicorn свои значения — Prometheus собирает их с каждого процесса отдельно
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount=1, *label_values):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # labels -> [счётчики по корзинам..., сумма, количество]
+        self.values = {}
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            state = self.values.get(label_values)
+            if state is None:
+                state = self.values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_values, state in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, state):
+                    lines.append(f"{self.name}_bucket{format_labels(self.labels, label_values, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, label_values, [('le', '+Inf')])} {state[-1]}")
+                lines.append(f"{self.name}_sum{format_labels(self.labels, label_values)} {state[-2]}")
+                lines.append(f"{self.name}_count{format_labels(self.labels, label_values)} {state[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        # Значения, которые считаются в момент опроса (размер хранилища и т.п.): функции -> [(имя, тип, описание, [(метки, значение)])]
+        self.collectors = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, collect):
+        self.collectors.append(collect)
+        return collect
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            for name, metric_type, help_text, samples in collect():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{format_labels(labels.keys(), labels.values())} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+request_duration = REGISTRY.histogram(
+    "task_tracker_request_duration_seconds", "Time to handle a request, including sending a streamed body",
+    ("method", "route", "status"))
+phase_duration = REGISTRY.histogram(
+    "task_tracker_phase_duration_seconds", "Time spent in hot-path phases (load, index, generate, serialize, persist, compact)",
+    ("phase",))
+items_processed = REGISTRY.counter(
+    "task_tracker_items_total", "Tasks processed by hot-path phases", ("phase",))
+
+
+@contextmanager
+def timed(phase):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phase_duration.observe(time.perf_counter() - started, phase)
+
+
+def count(phase, amount):
+    if amount:
+        items_processed.inc(amount, phase)
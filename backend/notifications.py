@@ -0,0 +1,151 @@
+import heapq
+import json
+import threading
+from collections import deque
+from datetime import datetime, time, timedelta
+
+NOTIFY_BEFORE = timedelta(minutes=30)
+# Напоминание, которое опоздало больше чем на это время (сервер не работал), уже не отправляем
+NOTIFY_GRACE = timedelta(minutes=2)
+EVENT_HISTORY = 500
+# Как часто ожидающий клиент сверяется с общим поколением хранилища: задачи мог изменить другой воркер
+REFRESH_SECONDS = 5.0
+
+
+def notification_deadline(record):
+    # Когда напомнить о задаче: за 30 минут до её времени. None — напоминать не о чем
+    task = record.task
+    if record.completed or record.day is None or not task.get("time"):
+        return None
+    if record.original_task_id is None and record.repeat_interval not in [None, "none"]:
+        return None
+    try:
+        hour, minute = map(int, task["time"].split(":"))
+        return datetime.combine(record.day, time(hour, minute)) - NOTIFY_BEFORE
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+# Планировщик напоминаний: куча ближайших сроков обновляется при commit() (подписчик хранилища),
+# а срабатывания копятся в журнале событий с номерами — клиенты ждут новые события через SSE или long-poll.
+# Работа сервера пропорциональна числу наступивших сроков, а не числу клиентов и задач
+class NotificationScheduler:
+    def __init__(self, history=EVENT_HISTORY):
+        self.condition = threading.Condition()
+        self.store = None
+        self.heap = []
+        # Актуальный срок каждой задачи: записи кучи с другим сроком устарели и пропускаются при извлечении
+        self.deadlines = {}
+        # Уже отправленные сроки: task_id -> срок. Переживают reset() — иначе перечитывание хранилища
+        # (запись другого воркера, откат пачки) вернуло бы в кучу и повторно отправило свежие напоминания
+        self.fired = {}
+        self.events = deque(maxlen=history)
+        self.last_event_id = 0
+
+    def reset(self, store):
+        with self.condition:
+            self.store = store
+            self.deadlines = {}
+            for record in store.records.values():
+                deadline = self._pending_deadline(record)
+                if deadline is not None:
+                    self.deadlines[record.id] = deadline
+            self.heap = [(deadline, task_id) for task_id, deadline in self.deadlines.items()]
+            heapq.heapify(self.heap)
+            self.condition.notify_all()
+
+    def apply(self, store, changes):
+        with self.condition:
+            woken = False
+            for old, new in changes:
+                task_id = (new or old).id
+                deadline = self._pending_deadline(new) if new is not None else None
+                if deadline == self.deadlines.get(task_id):
+                    continue
+                if deadline is None:
+                    del self.deadlines[task_id]
+                    continue
+                self.deadlines[task_id] = deadline
+                heapq.heappush(self.heap, (deadline, task_id))
+                woken = woken or self.heap[0] == (deadline, task_id)
+            if len(self.heap) > 2 * len(self.deadlines) + 64:
+                # Устаревших записей стало больше живых — пересобираем кучу
+                self.heap = [(deadline, task_id) for task_id, deadline in self.deadlines.items()]
+                heapq.heapify(self.heap)
+            if woken:
+                # Новый срок раньше всех прежних — ожидающие должны пересчитать таймаут
+                self.condition.notify_all()
+
+    def _pending_deadline(self, record):
+        # Срок, о котором ещё не напоминали; правка задачи без смены срока не отправляет напоминание снова
+        deadline = notification_deadline(record)
+        if deadline is not None and self.fired.get(record.id) == deadline:
+            return None
+        return deadline
+
+    def _fire_due(self, now):
+        fired_any = False
+        while self.heap and self.heap[0][0] <= now:
+            deadline, task_id = heapq.heappop(self.heap)
+            if self.deadlines.get(task_id) != deadline:
+                continue
+            del self.deadlines[task_id]
+            self.fired[task_id] = deadline
+            fired_any = True
+            task = self.store.get_task(task_id) if self.store is not None else None
+            if task is None or now - deadline > NOTIFY_GRACE:
+                continue
+
+            self.last_event_id += 1
+            self.events.append({
+                "event_id": self.last_event_id,
+                "task_id": task_id,
+                "title": task["title"],
+                "time": task.get("time", ""),
+                "description": task.get("description", ""),
+                "notification_time": now.isoformat()
+            })
+            self.condition.notify_all()
+        if fired_any:
+            # Срок старше NOTIFY_GRACE не отправится и так — помнить его больше не нужно
+            self.fired = {task_id: deadline for task_id, deadline in self.fired.items() if now - deadline <= NOTIFY_GRACE}
+
+    def _events_after(self, since, now):
+        if since is None or since > self.last_event_id:
+            # Новый клиент (или номер из другого процесса/до перезапуска): только свежие срабатывания
+            fresh_after = (now - NOTIFY_GRACE).isoformat()
+            return [e for e in self.events if e["notification_time"] >= fresh_after]
+        if self.events and since >= self.events[-1]["event_id"]:
+            return []
+        return [e for e in self.events if e["event_id"] > since]
+
+    def wait(self, since=None, timeout=25.0, refresh=REFRESH_SECONDS):
+        # Ждём, пока появятся события новее since, но не дольше timeout секунд
+        give_up = datetime.now() + timedelta(seconds=timeout)
+        while True:
+            # Изменения других воркеров этот процесс видит только при перечитывании: store.get() сверяет
+            # поколение и при необходимости перечитывает данные, а reset() пересобирает кучу.
+            # Вызывается без self.condition — писатель берёт блокировки в порядке «хранилище, затем condition»
+            if self.store is not None:
+                self.store.get()
+            with self.condition:
+                now = datetime.now()
+                self._fire_due(now)
+                events = self._events_after(since, now)
+                if events or now >= give_up:
+                    return events, self.last_event_id
+                wake_at = min(give_up, now + timedelta(seconds=refresh))
+                if self.heap:
+                    wake_at = min(wake_at, self.heap[0][0])
+                self.condition.wait(max((wake_at - now).total_seconds(), 0.01))
+
+
+def sse_events(scheduler, since, keepalive=15.0):
+    # Поток Server-Sent Events; комментарий-пинг не даёт прокси закрыть молчащее соединение
+    yield "retry: 5000\n\n"
+    while True:
+        events, since = scheduler.wait(since, keepalive)
+        if not events:
+            yield ": keepalive\n\n"
+        for event in events:
+            yield f"id: {event['event_id']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
@@ -0,0 +1,105 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# Профилирование медленных запросов, включается явно: PROFILE_SLOW_REQUESTS_MS=<порог>.
+# Пока запрос выполняется, фоновый поток раз в PROFILE_INTERVAL_MS снимает стек его потока;
+# если запрос оказался дольше порога, стеки пишутся в PROFILE_DIR в свёрнутом формате
+# ("функция;функция;... число") — его понимают flamegraph.pl и speedscope.
+# PROFILE_REQUEST_RATE — доля наблюдаемых запросов; заголовок X-Profile: 1 включает наблюдение для одного запроса
+PROFILE_SLOW_REQUESTS_MS = os.environ.get("PROFILE_SLOW_REQUESTS_MS")
+PROFILE_REQUEST_RATE = float(os.environ.get("PROFILE_REQUEST_RATE", "1.0"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+
+def collapse_stack(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    def __init__(self, interval):
+        self.interval = interval
+        self.condition = threading.Condition()
+        # id потока -> Counter(свёрнутый стек -> число снимков)
+        self.watched = {}
+        self.thread = None
+        self.pid = None
+
+    def start(self, thread_id):
+        with self.condition:
+            self.watched[thread_id] = Counter()
+            # После fork поток сэмплера остаётся в родителе
+            if self.thread is None or self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def stop(self, thread_id):
+        with self.condition:
+            return self.watched.pop(thread_id, Counter())
+
+    def run(self):
+        own_id = threading.get_ident()
+        while True:
+            with self.condition:
+                # Без наблюдаемых запросов поток спит и не просыпается по таймеру
+                while not self.watched:
+                    self.condition.wait()
+                frames = sys._current_frames()
+                for thread_id, samples in self.watched.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None and thread_id != own_id:
+                        samples[collapse_stack(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+class SlowRequestProfiler:
+    def __init__(self, threshold_ms=PROFILE_SLOW_REQUESTS_MS, rate=PROFILE_REQUEST_RATE,
+                 interval_ms=PROFILE_INTERVAL_MS, directory=PROFILE_DIR):
+        self.threshold = float(threshold_ms) / 1000 if threshold_ms else None
+        self.rate = rate
+        self.directory = directory
+        self.sampler = StackSampler(interval_ms / 1000)
+        self.written = 0
+
+    @property
+    def enabled(self):
+        return self.threshold is not None
+
+    def start(self, forced=False):
+        # Возвращает метку наблюдения для finish() или None, если запрос не профилируется
+        if not self.enabled or not (forced or random.random() < self.rate):
+            return None
+        thread_id = threading.get_ident()
+        self.sampler.start(thread_id)
+        return thread_id
+
+    def finish(self, thread_id, elapsed, label):
+        if thread_id is None:
+            return None
+        samples = self.sampler.stop(thread_id)
+        if elapsed < self.threshold or not samples:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        safe_label = "".join(c if c.isalnum() else "_" for c in label).strip("_")[:80]
+        path = os.path.join(
+            self.directory,
+            f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{os.getpid()}_{safe_label}_{int(elapsed * 1000)}ms.folded")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"# {label}: {elapsed * 1000:.1f} ms, {sum(samples.values())} samples\n")
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        self.written += 1
+        return path
@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+
+RESPONSE_CACHE_SIZE = 256
+# Ответы больше этого не кэшируем — такие отдаются потоком, и держать их копию в памяти незачем
+MAX_CACHED_BODY = 1024 * 1024
+
+
+# Готовые тела ответов по ключу (адрес с параметрами, сегодняшняя дата, ревизия хранилища), вытеснение — LRU.
+# Подписчик хранилища: любой commit() и перечитывание сбрасывают кэш целиком, смена даты — тоже
+class ResponseCache:
+    def __init__(self, size=RESPONSE_CACHE_SIZE, max_body=MAX_CACHED_BODY):
+        self.size = size
+        self.max_body = max_body
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.day = None
+        self.hits = 0
+        self.misses = 0
+
+    def reset(self, store):
+        self.invalidate()
+
+    def apply(self, store, changes):
+        self.invalidate()
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+
+    def key(self, store, url, today):
+        return url, today, store.revision
+
+    def get(self, key):
+        with self.lock:
+            if key[1] != self.day:
+                # Наступил новый день: вчерашние ответы больше не понадобятся
+                self.entries.clear()
+                self.day = key[1]
+            body = self.entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_body:
+            return
+        with self.lock:
+            if key[1] != self.day:
+                return
+            self.entries[key] = body
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def tee(self, store, key, chunks):
+        # Пропускает куски потокового ответа к клиенту и, если ответ дочитан целиком, а хранилище
+        # за это время не менялось, кладёт собранное тело в кэш
+        parts = []
+        size = 0
+        for chunk in chunks:
+            if parts is not None:
+                parts.append(chunk)
+                size += len(chunk)
+                if size > self.max_body:
+                    parts = None
+            yield chunk
+        if parts is not None and store.revision == key[2]:
+            self.put(key, "".join(parts).encode("utf-8"))
@@ -0,0 +1,92 @@
+import re
+from bisect import bisect_left, insort
+
+WORD_PATTERN = re.compile(r"\w+")
+SEARCH_FIELDS = ("title", "description")
+
+
+def tokenize(text):
+    # Регистр не важен, «ё» ищется как «е»; \w в Python покрывает и кириллицу, и цифры
+    if not text:
+        return []
+    return WORD_PATTERN.findall(text.casefold().replace("ё", "е"))
+
+
+def task_tokens(task):
+    tokens = set()
+    for field in SEARCH_FIELDS:
+        value = task.get(field)
+        if isinstance(value, str):
+            tokens.update(tokenize(value))
+    return frozenset(tokens)
+
+
+# Обратный индекс по названию и описанию задач: слово -> id задач, плюс отсортированный словарь для поиска по префиксу.
+# Подписчик хранилища, как HabitAggregates: commit() обновляет только изменившиеся задачи.
+# Словарь задачи к моменту apply() уже изменён на месте, поэтому прежние слова задачи берутся из tokens_by_id
+class SearchIndex:
+    def __init__(self):
+        self.postings = {}
+        self.vocabulary = []
+        self.tokens_by_id = {}
+
+    def reset(self, store):
+        self.postings = {}
+        self.tokens_by_id = {}
+        for task in store.data["tasks"]:
+            tokens = task_tokens(task)
+            self.tokens_by_id[task["id"]] = tokens
+            for token in tokens:
+                self.postings.setdefault(token, set()).add(task["id"])
+        self.vocabulary = sorted(self.postings)
+
+    def apply(self, store, changes):
+        for old, new in changes:
+            task_id = (new or old).id
+            old_tokens = self.tokens_by_id.pop(task_id, frozenset())
+            new_tokens = task_tokens(new.task) if new is not None else frozenset()
+            if new is not None:
+                self.tokens_by_id[task_id] = new_tokens
+            for token in old_tokens - new_tokens:
+                self._remove(token, task_id)
+            for token in new_tokens - old_tokens:
+                self._add(token, task_id)
+
+    def _add(self, token, task_id):
+        ids = self.postings.get(token)
+        if ids is None:
+            ids = self.postings[token] = set()
+            insort(self.vocabulary, token)
+        ids.add(task_id)
+
+    def _remove(self, token, task_id):
+        ids = self.postings.get(token)
+        if ids is None:
+            return
+        ids.discard(task_id)
+        if not ids:
+            del self.postings[token]
+            del self.vocabulary[bisect_left(self.vocabulary, token)]
+
+    def matching(self, prefix):
+        # id задач, у которых есть слово, начинающееся с prefix
+        ids = set()
+        for i in range(bisect_left(self.vocabulary, prefix), len(self.vocabulary)):
+            token = self.vocabulary[i]
+            if not token.startswith(prefix):
+                break
+            ids.update(self.postings[token])
+        return ids
+
+    def search(self, query):
+        # Задачи, в которых есть все слова запроса, каждое — как начало слова («задач» найдёт «задачи»)
+        terms = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not terms:
+            return set()
+        # Длинные префиксы дают меньше кандидатов — с них и начинаем пересечение
+        ids = self.matching(terms[0])
+        for term in terms[1:]:
+            if not ids:
+                break
+            ids &= self.matching(term)
+        return ids
@@ -0,0 +1,115 @@
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+MAX_OPEN_SHARDS = int(os.environ.get("MAX_OPEN_SHARDS", "64"))
+USER_KEY_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+USER_PREFIX = "/users/"
+
+
+def split_user_path(path):
+    # "/users/<ключ>/tasks/" -> ("<ключ>", "/tasks/"); путь без префикса -> (None, path) — общие данные.
+    # Недопустимый ключ -> ("", path): такой запрос не должен попасть ни в чьи данные
+    if not path.startswith(USER_PREFIX):
+        return None, path
+    user_key, _, rest = path[len(USER_PREFIX):].partition("/")
+    if not USER_KEY_PATTERN.fullmatch(user_key):
+        return "", path
+    return user_key, "/" + rest
+
+
+def shard_path(users_dir, user_key, file_name):
+    return os.path.join(users_dir, user_key, file_name)
+
+
+# Открытые хранилища пользователей (шарды): открываются при первом обращении, держится не больше max_open.
+# Вытесняется давно не использованный шард, с которым прямо сейчас не работает ни один запрос.
+# Шард открывается вне общей блокировки (чтение файла, индексы, пропущенные ежедневные задачи) — остальные
+# пользователи его не ждут; запросы того же пользователя ждут на его событии в opening, а не открывают второй раз
+class ShardPool:
+    def __init__(self, open_shard, max_open=MAX_OPEN_SHARDS):
+        self.open_shard = open_shard
+        self.max_open = max_open
+        self.lock = threading.Lock()
+        self.shards = OrderedDict()
+        self.in_use = Counter()
+        self.opening = {}
+
+    def peek(self, user_key):
+        with self.lock:
+            return self.shards.get(user_key)
+
+    def open_shards(self):
+        with self.lock:
+            return list(self.shards.values())
+
+    def acquire(self, user_key, create=True):
+        # create=False — не заводить данные пользователю, которого ещё нет: тогда None
+        while True:
+            with self.lock:
+                if user_key in self.shards:
+                    shard, evicted = self._use(user_key)
+                    break
+                opening = self.opening.get(user_key)
+                owner = opening is None
+                if owner:
+                    opening = self.opening[user_key] = threading.Event()
+            if not owner:
+                # Шард открывает другой запрос; если у него не вышло (или он только читал и такого пользователя
+                # нет) — открываем сами
+                opening.wait()
+                continue
+            try:
+                shard = self.open_shard(user_key, create)
+            except BaseException:
+                with self.lock:
+                    del self.opening[user_key]
+                opening.set()
+                raise
+            with self.lock:
+                del self.opening[user_key]
+                opening.set()
+                if shard is None:
+                    return None
+                self.shards[user_key] = shard
+                shard, evicted = self._use(user_key)
+            break
+        for old in evicted:
+            old.close()
+        return shard
+
+    def _use(self, user_key):
+        self.shards.move_to_end(user_key)
+        self.in_use[user_key] += 1
+        return self.shards[user_key], self._evict()
+
+    def release(self, user_key):
+        with self.lock:
+            self.in_use[user_key] -= 1
+            if not self.in_use[user_key]:
+                del self.in_use[user_key]
+            evicted = self._evict()
+        for old in evicted:
+            old.close()
+
+    def _evict(self):
+        evicted = []
+        for user_key in list(self.shards):
+            if len(self.shards) <= self.max_open:
+                break
+            if not self.in_use[user_key]:
+                evicted.append(self.shards.pop(user_key))
+        return evicted
+
+    @contextmanager
+    def use(self, user_key, create=True):
+        shard = self.acquire(user_key, create)
+        if shard is None:
+            yield None
+            return
+        try:
+            yield shard
+        finally:
+            self.release(user_key)
@@ -0,0 +1,114 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+PRIORITY_CODES = {"low": 0, "medium": 1, "high": 2}
+
+
+def is_counted(record, same_day=False):
+    # В статистику дня попадают задачи этого дня, кроме самих повторяющихся шаблонов
+    # (шаблон считается, только если он выполнен)
+    if record.day is None:
+        return False
+    if record.original_task_id is None and record.repeat_interval not in [None, "none"]:
+        return is_done(record, same_day)
+    return True
+
+
+def is_done(record, same_day=False):
+    # За диапазон дат задача выполнена, даже если её отметили позже её дня.
+    # Правило «выполнена в тот же день» — только для /stats/ за сегодня, как на экране «сегодня»
+    if same_day:
+        return record.completed and record.completed_on == record.day
+    return bool(record.completed)
+
+
+# Колоночное представление задач для статистики: по массиву на поле, строки отсортированы по дню.
+# Диапазон дат — это срез [lo, hi), а каждая метрика — одна свёртка по срезу на уровне C (sum, count)
+class StatsColumns:
+    def __init__(self, records, same_day=False):
+        rows = sorted((r for r in records if is_counted(r, same_day)), key=lambda r: r.day_ordinal)
+
+        self.day = array('l', (r.day_ordinal for r in rows))
+        self.done = array('b', (is_done(r, same_day) for r in rows))
+        self.priority = array('b', (PRIORITY_CODES.get(r.task.get("priority"), -1) for r in rows))
+        self.minutes = array('l', (int(r.task.get("estimated_time") or 0) for r in rows))
+        self.done_minutes = array('l', (m if d else 0 for m, d in zip(self.minutes, self.done)))
+
+    def bounds(self, date_from, date_to):
+        return (bisect_left(self.day, date_from.toordinal()),
+                bisect_right(self.day, date_to.toordinal()))
+
+    def summarize(self, lo, hi):
+        total_tasks = hi - lo
+        completed_tasks = sum(self.done[lo:hi])
+        priority = self.priority[lo:hi]
+        total_time = sum(self.minutes[lo:hi])
+        completed_time = sum(self.done_minutes[lo:hi])
+
+        return {
+            "total_tasks": total_tasks,
+            "completed_tasks": completed_tasks,
+            "completion_rate": (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0,
+            "high_priority": priority.count(PRIORITY_CODES["high"]),
+            "medium_priority": priority.count(PRIORITY_CODES["medium"]),
+            "low_priority": priority.count(PRIORITY_CODES["low"]),
+            "total_time_minutes": total_time,
+            "completed_time_minutes": completed_time,
+            "time_completion_rate": (completed_time / total_time * 100) if total_time > 0 else 0
+        }
+
+    def summarize_range(self, date_from, date_to):
+        return self.summarize(*self.bounds(date_from, date_to))
+
+    def group_by_day(self, date_from, date_to):
+        groups = []
+        day = date_from
+        while day <= date_to:
+            groups.append({"key": day.isoformat(), **self.summarize_range(day, day)})
+            day += timedelta(days=1)
+        return groups
+
+    def group_by_week(self, date_from, date_to):
+        # Недели с понедельника; первая и последняя могут быть неполными
+        groups = []
+        start = date_from
+        while start <= date_to:
+            end = min(start + timedelta(days=6 - start.weekday()), date_to)
+            week_start = start - timedelta(days=start.weekday())
+            groups.append({"key": week_start.isoformat(), **self.summarize_range(start, end)})
+            start = end + timedelta(days=1)
+        return groups
+
+
+class StatsEngine:
+    def __init__(self, records):
+        records = list(records)
+        self.columns = StatsColumns(records)
+
+        by_category = {}
+        for record in records:
+            by_category.setdefault(record.task.get("category_id"), []).append(record)
+        self.category_columns = {category_id: StatsColumns(rs) for category_id, rs in by_category.items()}
+
+    def report(self, date_from, date_to, group_by=None):
+        report = {
+            "from": date_from.isoformat(),
+            "to": date_to.isoformat(),
+            "summary": self.columns.summarize_range(date_from, date_to)
+        }
+        if group_by == "day":
+            report["groups"] = self.columns.group_by_day(date_from, date_to)
+        elif group_by == "week":
+            report["groups"] = self.columns.group_by_week(date_from, date_to)
+        elif group_by == "category":
+            groups = []
+            for category_id, columns in self.category_columns.items():
+                summary = columns.summarize_range(date_from, date_to)
+                if summary["total_tasks"]:
+                    groups.append({"key": category_id, **summary})
+            groups.sort(key=lambda g: (g["key"] is None, g["key"] or 0))
+            report["groups"] = groups
+        if group_by is not None:
+            report["group_by"] = group_by
+        return report
@@ -0,0 +1,1226 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import codec
+import metrics
+
+try:
+    import fcntl
+except ImportError:
+    # Без fcntl (Windows) блокировка работает только между потоками одного процесса
+    fcntl = None
+
+
+# Сколько последних удалений помнит хранилище: по ним GET /tasks/changes отдаёт удалённые id
+TOMBSTONE_LIMIT = 10000
+
+
+class PersistError(RuntimeError):
+    pass
+
+
+def empty_data():
+    return {"tasks": [], "categories": [], "deleted": []}
+
+
+def add_tombstones(data, task_ids, generation):
+    # Удаления хранятся вместе с данными парами [id, поколение] — как поле revision у задач,
+    # чтобы дельты по ?since= переживали перечитывание хранилища и были общими для всех воркеров
+    tombstones = data.setdefault("deleted", [])
+    tombstones.extend([task_id, generation] for task_id in task_ids)
+    if len(tombstones) > TOMBSTONE_LIMIT:
+        del tombstones[:-TOMBSTONE_LIMIT]
+
+
+def dedupe_ids(tasks, last_id=0):
+    # Старый генератор id (метка времени, len(tasks) + 1) выдавал дубли — повторам выдаём свободные id.
+    # last_id — наибольший id вне tasks (в архиве): его тоже нельзя выдавать повторно
+    seen = set()
+    last_id = max(max((t["id"] for t in tasks), default=0), last_id)
+    for task in tasks:
+        if task["id"] in seen:
+            last_id += 1
+            task["id"] = last_id
+        seen.add(task["id"])
+
+
+def is_recurring_template(task):
+    return (task.get("original_task_id") is None and
+            bool(task.get("repeat_interval")) and
+            task.get("repeat_interval") != "none")
+
+
+def parse_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).date()
+    except Exception:
+        return None
+
+
+def task_day(task):
+    return parse_date(task.get("date") or task.get("created_at"))
+
+
+def weekday_mask(repeat_days):
+    # "0,2,4" или [0, 2, 4] -> битовая маска дней недели (бит 0 — понедельник)
+    mask = 0
+    try:
+        if isinstance(repeat_days, str):
+            days = [int(day.strip()) for day in repeat_days.split(",") if day.strip()]
+        elif isinstance(repeat_days, list):
+            days = [int(day) for day in repeat_days]
+        else:
+            days = []
+    except (ValueError, TypeError):
+        return 0
+    for day in days:
+        if 0 <= day < 7:
+            mask |= 1 << day
+    return mask
+
+
+# Компактная запись задачи с уже разобранными датами. Строится один раз при индексации задачи,
+# чтобы проверки «просрочена/на сегодня/генерировать ли» не парсили ISO-строки на каждом запросе.
+# Сам словарь задачи остаётся форматом хранения и ответа API
+class TaskRecord:
+    __slots__ = (
+        "task", "id", "day", "day_ordinal", "created", "completed", "completed_on",
+        "original_task_id", "repeat_interval", "repeat_until", "weekday_mask", "skipped_dates"
+    )
+
+    def __init__(self, task):
+        self.task = task
+        self.id = task["id"]
+        self.day = task_day(task)
+        self.day_ordinal = self.day.toordinal() if self.day else None
+        self.created = parse_date(task.get("created_at"))
+        self.completed = bool(task.get("completed"))
+        self.completed_on = parse_date(task.get("completed_at"))
+        self.original_task_id = task.get("original_task_id")
+        self.repeat_interval = task.get("repeat_interval")
+        self.repeat_until = parse_date(task.get("repeat_until"))
+        # None — дни повтора не заданы
+        self.weekday_mask = weekday_mask(task["repeat_days"]) if task.get("repeat_days") else None
+        # Дни, для которых повтор шаблона отменён (удалили виртуальный экземпляр)
+        self.skipped_dates = frozenset(filter(None, map(parse_date, task.get("skipped_dates") or ())))
+
+
+def write_temp(path, content):
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp_path
+
+
+def atomic_write(path, content):
+    # Пишем во временный файл и подменяем целиком, чтобы на диске никогда не оказался обрезанный документ
+    os.replace(write_temp(path, content), path)
+
+
+class SharedLock:
+    def __init__(self, lock):
+        self.lock = lock
+
+    def __enter__(self):
+        return self.lock.acquire_shared()
+
+    def __exit__(self, *exc_info):
+        self.lock.release_shared()
+
+
+# Блокировка хранилища сразу между потоками и между воркерами gunicorn/uWSGI (flock на <файл>.lock).
+# with lock — запись: исключительная, повторно входимая в том же потоке, LOCK_EX. with lock.shared — чтение:
+# читатели не ждут друг друга, а процесс держит LOCK_SH, так что и читатели разных воркеров идут параллельно.
+# Читатели, ждавшие освобождения писателя, проходят раньше следующего писателя — никто не голодает.
+# В том же файле лежит общее состояние воркеров: номер последнего изменения и последний выданный id
+class StoreLock:
+    def __init__(self, path):
+        self.path = path
+        self.condition = threading.Condition()
+        # Поток-писатель и глубина его вложенных входов
+        self.owner = None
+        self.depth = 0
+        # Поток-читатель -> глубина вложенных входов
+        self.readers = {}
+        self.waiting_readers = 0
+        self.waiting_writers = 0
+        # Растёт при каждом уходе писателя; admitted — сколько ждавших к этому моменту читателей ещё не вошли
+        self.write_phase = 0
+        self.admitted = 0
+        # Писатель пропускает читателей посреди пачки (let_readers_in): другие писатели ждут
+        self.window_owner = None
+        # Какой flock держит процесс (LOCK_SH / LOCK_EX / None) и сколько читателей сейчас на нём
+        self.flock_guard = threading.Lock()
+        self.flock_mode = None
+        self.flock_readers = 0
+        self.shared = SharedLock(self)
+        self.fd = None
+        self.pid = None
+
+    def _open(self):
+        # После fork (gunicorn --preload) дескриптор общий с родителем, и flock между воркерами не исключал бы друг друга
+        if self.fd is not None and self.pid != os.getpid():
+            self.fd = None
+            self.flock_mode = None
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self.pid = os.getpid()
+
+    def _flock(self, mode):
+        if fcntl is None:
+            return
+        self._open()
+        fcntl.flock(self.fd, mode)
+        self.flock_mode = None if mode == fcntl.LOCK_UN else mode
+
+    def held(self):
+        # "write" / "read" / None — что держит текущий поток
+        me = threading.get_ident()
+        if self.owner == me:
+            return "write"
+        return "read" if me in self.readers else None
+
+    def acquire(self):
+        me = threading.get_ident()
+        with self.condition:
+            if self.owner == me:
+                self.depth += 1
+                return True
+            if me in self.readers:
+                raise RuntimeError("Store lock cannot be upgraded from read to write")
+            self.waiting_writers += 1
+            try:
+                while (self.owner is not None or self.readers or self.admitted or
+                       self.window_owner not in (None, me)):
+                    self.condition.wait()
+            finally:
+                self.waiting_writers -= 1
+            self.owner = me
+            self.depth = 1
+        if fcntl is not None and self.flock_mode != fcntl.LOCK_EX:
+            try:
+                self._flock(fcntl.LOCK_EX)
+            except BaseException:
+                self._leave_writer()
+                raise
+        return True
+
+    def release(self):
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl is not None and self.window_owner is None:
+                self._flock(fcntl.LOCK_UN)
+            self._leave_writer()
+
+    def _leave_writer(self):
+        with self.condition:
+            self.owner = None
+            self.depth = 0
+            self.write_phase += 1
+            self.admitted = self.waiting_readers
+            self.condition.notify_all()
+
+    def acquire_shared(self):
+        me = threading.get_ident()
+        with self.condition:
+            if self.owner == me or me in self.readers:
+                # Чтение внутри своей же записи или вложенное чтение
+                self.readers[me] = self.readers.get(me, 0) + 1
+                return True
+            phase = self.write_phase
+            self.waiting_readers += 1
+            try:
+                while self.owner is not None or (self.waiting_writers and self.write_phase == phase):
+                    self.condition.wait()
+            finally:
+                self.waiting_readers -= 1
+            if self.write_phase != phase and self.admitted:
+                self.admitted -= 1
+            self.readers[me] = 1
+        if fcntl is not None:
+            try:
+                with self.flock_guard:
+                    # Первый читатель процесса берёт LOCK_SH; если процесс уже держит LOCK_EX (пачка писателя), хватает его
+                    if self.flock_mode is None:
+                        self._flock(fcntl.LOCK_SH)
+                    self.flock_readers += 1
+            except BaseException:
+                self._leave_reader(me)
+                raise
+        return True
+
+    def release_shared(self):
+        me = threading.get_ident()
+        if self.readers[me] > 1 or self.owner == me:
+            with self.condition:
+                self.readers[me] -= 1
+                if not self.readers[me]:
+                    del self.readers[me]
+            return
+        if fcntl is not None:
+            with self.flock_guard:
+                self.flock_readers -= 1
+                if not self.flock_readers and self.flock_mode == fcntl.LOCK_SH:
+                    self._flock(fcntl.LOCK_UN)
+        self._leave_reader(me)
+
+    def _leave_reader(self, me):
+        with self.condition:
+            del self.readers[me]
+            if not self.readers:
+                self.condition.notify_all()
+
+    def let_readers_in(self):
+        # Писатель посреди длинной пачки ненадолго пускает ждущих читателей, не отпуская LOCK_EX:
+        # другие воркеры пачку не прервут, а читатели увидят данные в памяти, которые пачка запишет на диск
+        me = threading.get_ident()
+        with self.condition:
+            if self.owner != me or not self.waiting_readers:
+                return
+            depth = self.depth
+            self.window_owner = me
+            self.owner = None
+            self.depth = 0
+            self.write_phase += 1
+            self.admitted = self.waiting_readers
+            self.condition.notify_all()
+            # Пока ждём, новые читатели не входят — иначе их поток не дал бы пачке продолжиться
+            self.waiting_writers += 1
+            while self.readers or self.admitted:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.window_owner = None
+            self.owner = me
+            self.depth = depth
+
+    def close(self):
+        # Дожидаемся текущих владельцев; flock снимается вместе с закрытием дескриптора
+        me = threading.get_ident()
+        with self.condition:
+            while self.owner not in (None, me) or self.readers:
+                self.condition.wait()
+            if self.fd is not None and self.pid == os.getpid():
+                os.close(self.fd)
+            self.fd = None
+            self.flock_mode = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def _read(self):
+        # pread/pwrite без общего смещения: состояние читают сразу несколько потоков-читателей
+        try:
+            return json.loads(os.pread(self.fd, 4096, 0) or b"{}")
+        except ValueError:
+            return {}
+
+    def _write(self, state):
+        content = json.dumps(state).encode()
+        os.ftruncate(self.fd, len(content))
+        os.pwrite(self.fd, content, 0)
+
+    def read_state(self):
+        # (generation, last_id); None — файла состояния ещё нет или он повреждён
+        if fcntl is None:
+            return None, None
+        state = self._read()
+        return state.get("generation"), state.get("last_id")
+
+    def write_state(self, generation, last_id):
+        if fcntl is None:
+            return
+        self._write(dict(self._read(), generation=generation, last_id=last_id))
+
+    # Прочие общие для воркеров значения (например, до какого дня уже созданы повторения); без fcntl их нет
+    def read_value(self, key):
+        return self._read().get(key) if fcntl is not None else None
+
+    def write_value(self, key, value):
+        if fcntl is not None:
+            self._write(dict(self._read(), **{key: value}))
+
+
+# Резидентное хранилище: файл читается один раз, дальше данные живут в памяти
+class TaskStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = StoreLock(f"{path}.lock")
+        self.data = empty_data()
+        self.mtime = None
+        # Номер последнего изменения, который видел этот процесс; другой воркер меняет его в <файл>.lock
+        self.generation = None
+        # Наибольшее поколение, записанное в самих данных (revision задач и удалений): счётчик в <файл>.lock
+        # может пропасть, а номера изменений не должны пойти заново
+        self.data_generation = 0
+        self.last_id = None
+        self.by_id = {}
+        self.records = {}
+        self.by_day = {}
+        self.by_template = {}
+        self.templates = {}
+        self.index_keys = {}
+        self.category_index = None
+        self.category_version = 0
+        # Растёт при каждом изменении и перечитывании — по нему сбрасываются производные кэши
+        self.revision = 0
+        self.listeners = []
+        # Архив читается только по запросу (история, статистика) и держится в памяти до перечитывания
+        self.archive = None
+        self.archive_by_day = None
+        # Внутри batch() сюда копятся изменения, которые ещё не записаны на диск, и id, которые надо убрать из архива
+        self.pending = None
+        self.pending_archive_drops = set()
+        self.reload()
+
+    def close(self):
+        # Хранилище больше не нужно (вытеснено из пула шардов): освобождаем файловые дескрипторы
+        self.lock.close()
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def task_count(self):
+        return len(self.data["tasks"])
+
+    def data_files(self):
+        return [self.path, self.archive_path()]
+
+    def disk_size(self):
+        # Сколько байт хранилище занимает на диске вместе с архивом и журналом — для /metrics
+        size = 0
+        for path in self.data_files():
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+
+    def reload(self):
+        with self.lock:
+            self.mtime = self._file_mtime()
+            self.generation, _ = self.lock.read_state()
+            with metrics.timed("load"):
+                self.data = self._read_file()
+            metrics.count("load", len(self.data["tasks"]))
+            self.last_id = None
+            self.archive = None
+            with metrics.timed("index"):
+                self._build_indexes()
+            self.revision += 1
+            return self.data
+
+    def _read_file(self):
+        try:
+            if not os.path.exists(self.path):
+                return empty_data()
+
+            with open(self.path, 'rb') as f:
+                content = f.read()
+            if not content.strip():
+                return empty_data()
+
+            # Формат (JSON с отступами, компактный JSON или msgpack) определяется по содержимому
+            data = codec.decode_data(content)
+            if "tasks" not in data:
+                data["tasks"] = []
+            if "categories" not in data:
+                data["categories"] = []
+            if "deleted" not in data:
+                data["deleted"] = []
+            dedupe_ids(data["tasks"], self.archive_last_id())
+            return data
+        except codec.CodecUnavailable:
+            # Файл цел, просто нечем его прочитать — нельзя ни затирать его, ни уводить в бэкап
+            raise
+        except ValueError:
+            if os.path.exists(self.path):
+                backup_name = f"{self.path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                os.rename(self.path, backup_name)
+            self.mtime = None
+            return empty_data()
+        except Exception:
+            return empty_data()
+
+    def _is_stale(self):
+        generation, _ = self.lock.read_state()
+        return self._file_mtime() != self.mtime or generation != self.generation
+
+    def get(self):
+        # Если файл правили снаружи (вручную) или другой воркер записал изменение, перечитываем его.
+        # Изменять данные можно только под той же блокировкой, под которой они получены через get().
+        # Проверка — под общей блокировкой (LOCK_SH), перечитывание — под исключительной
+        held = self.lock.held()
+        if held == "read":
+            # Обработчик чтения уже работает с данными в памяти — подменять их под ним нельзя
+            return self.data
+        if held is None:
+            with self.lock.shared:
+                if not self._is_stale():
+                    return self.data
+        with self.lock:
+            if self._is_stale():
+                self.reload()
+            return self.data
+
+    def next_id(self):
+        # Монотонный счётчик id, общий для всех воркеров: метка времени и len(tasks) + 1 дают дубли
+        with self.lock:
+            generation, shared_last_id = self.lock.read_state()
+            if self.last_id is None:
+                # Архивированные задачи ушли из рабочего набора, но их id заняты
+                self.last_id = max(max((t["id"] for t in self.data["tasks"]), default=0), self.archive_last_id())
+            self.last_id = max(self.last_id, shared_last_id or 0) + 1
+            self.lock.write_state(generation, self.last_id)
+            return self.last_id
+
+    def _bump_generation(self):
+        # Сообщаем остальным воркерам, что их копия данных устарела
+        generation, shared_last_id = self.lock.read_state()
+        self.generation = max(generation or 0, self.generation or 0, self.data_generation) + 1
+        self.data_generation = self.generation
+        self.lock.write_state(self.generation, shared_last_id)
+
+    def save(self, data=None):
+        with self.lock:
+            if data is not None:
+                self.data = data
+                self._build_indexes()
+                self.revision += 1
+            atomic_write(self.path, codec.encode_data(self.data))
+            self.mtime = self._file_mtime()
+            if data is not None:
+                self._bump_generation()
+
+    def commit(self, op, changed=(), deleted=(), categories=False):
+        # op: create / update / complete / uncomplete / move / delete / category.
+        # changed — задачи, которые появились или изменились, deleted — id удалённых задач,
+        # categories=True — изменился список категорий.
+        with self.lock:
+            changes = []
+            for task_id in deleted:
+                old_record = self.records.get(task_id)
+                self._unindex(task_id)
+                if old_record is not None:
+                    changes.append((old_record, None))
+            for task in changed:
+                old_record = self.records.get(task["id"])
+                self._index(task)
+                changes.append((old_record, self.records[task["id"]]))
+            if categories:
+                self._invalidate_categories()
+            self.revision += 1
+            # Каждое изменение получает свой номер поколения — по нему клиенты синхронизируют дельты.
+            # Номер записывается в саму задачу (revision) и в список удалений, поэтому сохраняется на диске
+            self._bump_generation()
+            for task in changed:
+                task["revision"] = self.generation
+            if deleted:
+                add_tombstones(self.data, deleted, self.generation)
+            if self.pending is not None:
+                # Копии задач — такими, какими они были на момент commit(): savepoint() при откате
+                # восстанавливает по ним предыдущие изменения пачки
+                self.pending.append((op, [dict(t) for t in changed], list(deleted), categories, self.generation))
+            else:
+                try:
+                    with metrics.timed("persist"):
+                        self._persist(op, changed, deleted, categories)
+                except Exception as e:
+                    self._discard_unsaved(e)
+            for listener in self.listeners:
+                listener.apply(self, changes)
+
+    @contextmanager
+    def batch(self):
+        # Несколько commit() подряд под одной блокировкой и одна запись на диск в конце
+        with self.lock:
+            if self.pending is not None:
+                yield
+                return
+            self.pending = []
+            self.pending_archive_drops = set()
+            try:
+                yield
+            finally:
+                pending, self.pending = self.pending, None
+                archive_drops, self.pending_archive_drops = self.pending_archive_drops, set()
+                try:
+                    if pending:
+                        with metrics.timed("persist"):
+                            self._persist_batch(pending)
+                    # Из архива удаляем после записи рабочего набора: при падении между шагами лишнее останется в архиве, но не пропадёт
+                    if archive_drops:
+                        self._write_archive((), archive_drops)
+                        self.archive = None
+                except Exception as e:
+                    self._discard_unsaved(e)
+
+    def _discard_unsaved(self, error):
+        # Запись на диск не удалась: изменения, которых нет на диске, не оставляем и в памяти
+        # (задачи правились на месте — перечитываем файл) и сообщаем об ошибке вызывающему
+        self.reload()
+        raise PersistError(f"Failed to save changes: {error}") from error
+
+    @contextmanager
+    def savepoint(self):
+        # Всё или ничего: если блок завершился исключением, изменения, сделанные в нём, отменяются —
+        # и в памяти, и на диск они не попадут. Изменения внешней пачки (batch()), сделанные до блока, остаются
+        with self.batch():
+            mark = len(self.pending)
+            archive_drops = set(self.pending_archive_drops)
+            categories = [dict(c) for c in self.data["categories"]]
+            try:
+                yield
+            except BaseException:
+                del self.pending[mark:]
+                self.pending_archive_drops = archive_drops
+                self._restore(self.pending, categories)
+                raise
+
+    def _restore(self, pending, categories):
+        # Данные с диска плюс ещё не записанные изменения пачки; задачи правятся на месте, поэтому текущей копии не верим
+        data = self._read_file()
+        tasks_by_id = {t["id"]: t for t in data["tasks"]}
+        for _, changed, deleted, _, generation in pending:
+            for task_id in deleted:
+                tasks_by_id.pop(task_id, None)
+            add_tombstones(data, deleted, generation)
+            for task in changed:
+                tasks_by_id[task["id"]] = dict(task)
+        data["tasks"] = list(tasks_by_id.values())
+        data["categories"] = categories
+        self.data = data
+        self.mtime = self._file_mtime()
+        self.last_id = None
+        self.archive = None
+        self._build_indexes()
+        self.revision += 1
+
+    # Подписчики поддерживают свои производные данные инкрементально:
+    # apply(store, changes) получает пары (запись до, запись после), reset(store) — после полной перезагрузки
+    def subscribe(self, listener):
+        with self.lock:
+            self.listeners.append(listener)
+            listener.reset(self)
+
+    def _persist(self, op, changed, deleted, categories):
+        self.save()
+
+    def _persist_batch(self, batch):
+        # JSON-файл и так переписывается целиком — на всю пачку хватает одной записи
+        self.save()
+
+    # Индексы: id -> задача, день -> задачи, шаблон -> {день экземпляра -> экземпляр}, повторяющиеся шаблоны.
+    # Обновляются в commit(), поэтому каждый изменяющий путь обязан сообщать о своих изменениях через него
+    def _build_indexes(self):
+        self._invalidate_categories()
+        self.by_id = {}
+        self.records = {}
+        self.by_day = {}
+        self.by_template = {}
+        self.templates = {}
+        self.index_keys = {}
+        self.data_generation = max((generation for _, generation in self.data["deleted"]), default=0)
+        for task in self.data["tasks"]:
+            self._index(task)
+        for listener in self.listeners:
+            listener.reset(self)
+
+    def _index(self, task):
+        task_id = task["id"]
+        if task_id in self.index_keys:
+            self._unindex(task_id)
+
+        record = TaskRecord(task)
+        day = record.day
+        template_id = record.original_task_id
+        # Сгенерированный экземпляр относится к дню, на который его создали, даже если потом его перенесли
+        occurrence = record.created if template_id is not None else None
+
+        self.by_id[task_id] = task
+        self.records[task_id] = record
+        self.data_generation = max(self.data_generation, task.get("revision") or 0)
+        self.by_day.setdefault(day, {})[task_id] = task
+        if template_id is not None:
+            self.by_template.setdefault(template_id, {})[occurrence] = task
+        if is_recurring_template(task):
+            self.templates[task_id] = task
+        self.index_keys[task_id] = (day, template_id, occurrence)
+
+    def _unindex(self, task_id):
+        keys = self.index_keys.pop(task_id, None)
+        if keys is None:
+            return
+        day, template_id, occurrence = keys
+
+        self.by_id.pop(task_id, None)
+        self.records.pop(task_id, None)
+        self.templates.pop(task_id, None)
+        day_tasks = self.by_day.get(day)
+        if day_tasks is not None:
+            day_tasks.pop(task_id, None)
+            if not day_tasks:
+                del self.by_day[day]
+        if template_id is not None:
+            instances = self.by_template.get(template_id)
+            if instances is not None and instances.get(occurrence, {}).get("id") == task_id:
+                del instances[occurrence]
+                if not instances:
+                    del self.by_template[template_id]
+
+    def _invalidate_categories(self):
+        self.category_index = None
+        self.category_version += 1
+
+    def categories_by_id(self):
+        # Словарь категорий строится один раз на версию списка категорий
+        with self.lock.shared:
+            if self.category_index is None:
+                self.category_index = {cat["id"]: cat for cat in self.data["categories"]}
+            return self.category_index
+
+    def get_task(self, task_id):
+        return self.by_id.get(task_id)
+
+    def record(self, task):
+        # Для задачи не из хранилища (например, черновик с новыми настройками повтора) собираем запись на лету
+        record = self.records.get(task["id"])
+        if record is None or record.task is not task:
+            record = TaskRecord(task)
+        return record
+
+    def get_instance(self, template_id, day):
+        return self.by_template.get(template_id, {}).get(day)
+
+    def instance_days(self, template_id):
+        # {день повторения: id экземпляра} прямо из индекса — без чтения и разбора самих задач
+        with self.lock.shared:
+            return {day: task["id"] for day, task in self.by_template.get(template_id, {}).items()}
+
+    def remove_tasks(self, task_ids, template_id=None):
+        # Убирает из рабочего набора задачи с id из task_ids (и все экземпляры template_id) за один проход,
+        # а не пересборкой списка на каждую задачу. Возвращает id убранных — их нужно передать в commit(deleted=...)
+        with self.lock:
+            task_ids = set(task_ids)
+            kept = []
+            removed = []
+            for task in self.data["tasks"]:
+                if task["id"] in task_ids or (template_id is not None and task.get("original_task_id") == template_id):
+                    removed.append(task["id"])
+                else:
+                    kept.append(task)
+            if removed:
+                self.data["tasks"] = kept
+            return removed
+
+    def recurring_templates(self):
+        return list(self.templates.values())
+
+    # Запросы к хранилищу. Результат только для чтения: бэкенд может вернуть копии задач
+    def tasks_on(self, day):
+        with self.lock.shared:
+            return list(self.by_day.get(day, {}).values())
+
+    def tasks_between(self, date_from, date_to):
+        # Все задачи с датой в [date_from, date_to]: по одному обращению к индексу дней на каждый день
+        tasks = []
+        with self.lock.shared:
+            day = date_from
+            while day <= date_to:
+                tasks.extend(self.by_day.get(day, {}).values())
+                day += timedelta(days=1)
+        return tasks
+
+    def tasks_for_template(self, template_id):
+        with self.lock.shared:
+            return list(self.by_template.get(template_id, {}).values())
+
+    # Архив: выполненные задачи старше горизонта убираются из рабочего набора (и из /tasks/),
+    # их читают только история календаря, статистика и привычки
+    def archive_path(self):
+        return os.path.splitext(self.path)[0] + ".archive.json"
+
+    def _read_archive(self):
+        try:
+            with open(self.archive_path(), 'rb') as f:
+                return codec.decode_data(f.read()).get("tasks", [])
+        except FileNotFoundError:
+            return []
+
+    def _write_archive(self, added, removed_ids):
+        archive = {t["id"]: t for t in self._read_archive()}
+        for task_id in removed_ids:
+            archive.pop(task_id, None)
+        for task in added:
+            archive[task["id"]] = task
+        atomic_write(self.archive_path(), codec.encode_data({"tasks": list(archive.values())}))
+
+    def archive_last_id(self):
+        return max((t["id"] for t in self._read_archive()), default=0)
+
+    def _load_archive(self):
+        if self.archive is None:
+            # Задача может оказаться и в архиве, и в рабочем наборе, если процесс упал посреди архивации.
+            # Собираем целиком и только потом публикуем: архив могут загружать сразу несколько читателей
+            archive = {}
+            archive_by_day = {}
+            for task in self._read_archive():
+                if task["id"] not in self.by_id and task["id"] not in self.pending_archive_drops:
+                    record = TaskRecord(task)
+                    archive[task["id"]] = record
+                    archive_by_day.setdefault(record.day, []).append(task)
+            self.archive_by_day = archive_by_day
+            self.archive = archive
+        return self.archive
+
+    def archived_records(self):
+        with self.lock.shared:
+            return list(self._load_archive().values())
+
+    def is_archived(self, task_id):
+        with self.lock.shared:
+            return task_id in self._load_archive()
+
+    def archived_between(self, date_from, date_to):
+        with self.lock.shared:
+            self._load_archive()
+            tasks = []
+            day = date_from
+            while day <= date_to:
+                tasks.extend(self.archive_by_day.get(day, ()))
+                day += timedelta(days=1)
+            return tasks
+
+    def archive_completed(self, before):
+        # Переносим в архив выполненные задачи с датой раньше before (шаблоны повторов остаются).
+        # Сначала пишем архив, потом удаляем из рабочего набора — при падении между шагами ничего не теряется
+        with self.lock:
+            moving = [t for t in self.data["tasks"]
+                      if self.records[t["id"]].completed and self.records[t["id"]].day is not None
+                      and self.records[t["id"]].day < before and not is_recurring_template(t)]
+            if not moving:
+                return 0
+            self._write_archive(moving, ())
+            self.archive = None
+            self.commit("archive", deleted=self.remove_tasks(t["id"] for t in moving))
+            return len(moving)
+
+    def restore_archived(self, task_id):
+        # Задачу из архива снова меняют (выполнить, перенести, изменить) — возвращаем её в рабочий набор.
+        # Сначала рабочий набор, потом архив: при падении между шагами задача останется в обоих, как и при архивации
+        with self.lock:
+            record = self._load_archive().get(task_id)
+            if record is None:
+                return None
+            task = record.task
+            self.data["tasks"].append(task)
+            self.commit("restore", changed=[task])
+            self.drop_archived([task_id])
+            # Подписчики уже учли архивную задачу (выполнения привычек считаются и по архиву), а commit()
+            # сообщил о ней как о новой — пересчитываем их заново. Путь редкий: архивируются только старые задачи
+            for listener in self.listeners:
+                listener.reset(self)
+            return task
+
+    def delete_archived(self, task_id):
+        with self.lock:
+            record = self._load_archive().get(task_id)
+            if record is None:
+                return False
+            self.drop_archived([task_id])
+            if record.original_task_id is not None:
+                # Выполнение экземпляра учтено в агрегатах привычки, а commit() о задаче вне рабочего набора не сообщит
+                for listener in self.listeners:
+                    listener.reset(self)
+            return True
+
+    def drop_archived(self, task_ids):
+        with self.lock:
+            if not task_ids:
+                return
+            if self.pending is not None:
+                # Внутри пачки архив переписывается вместе с остальными изменениями — и откатывается вместе с ними
+                self.pending_archive_drops.update(task_ids)
+            else:
+                self._write_archive((), task_ids)
+            self.archive = None
+            # Архив входит в историю, статистику и календарь — их кэши привязаны к ревизии
+            self.revision += 1
+
+
+def apply_record(tasks_by_id, data, record):
+    # Запись журнала идемпотентна: сначала удаления, потом задачи целиком
+    for task_id in record.get("deleted") or ():
+        tasks_by_id.pop(task_id, None)
+    if record.get("deleted"):
+        add_tombstones(data, record["deleted"], record.get("generation") or 0)
+    for task in record.get("tasks") or ():
+        tasks_by_id[task["id"]] = task
+    if "categories" in record:
+        data["categories"] = record["categories"]
+
+
+# Журнальный режим: каждое изменение дописывается одной строкой в <файл>.journal,
+# а фоновое уплотнение сворачивает журнал обратно в снимок tasks_data.json
+class JournalTaskStore(TaskStore):
+    def __init__(self, path, compact_every=500):
+        self.journal_path = f"{path}.journal"
+        self.compacting_path = f"{path}.journal.compacting"
+        self.compact_every = compact_every
+        self.journal_records = 0
+        self.compaction_thread = None
+        self.compaction_scheduled = False
+        self.compaction_in_progress = False
+        self.compaction_requested = False
+        # Уплотняет журнал только один воркер за раз
+        self.compaction_lock_path = f"{path}.journal.lock"
+        super().__init__(path)
+
+    def _try_lock_compaction(self):
+        if fcntl is None:
+            return True
+        fd = os.open(self.compaction_lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def _unlock_compaction(self, fd):
+        if fcntl is not None:
+            os.close(fd)
+
+    def _read_file(self):
+        data = super()._read_file()
+        tasks_by_id = {t["id"]: t for t in data["tasks"]}
+        self.journal_records = 0
+        # .compacting остаётся, только если процесс упал посреди уплотнения — его записи старше основного журнала
+        for journal_path in (self.compacting_path, self.journal_path):
+            self.journal_records += self._replay(journal_path, tasks_by_id, data)
+        data["tasks"] = list(tasks_by_id.values())
+        return data
+
+    def data_files(self):
+        return super().data_files() + [self.journal_path, self.compacting_path]
+
+    def close(self):
+        # Начатое уплотнение доводим до конца — снимок и журнал не должны остаться на полпути
+        if self.compaction_thread is not None:
+            self.compaction_thread.join()
+        super().close()
+
+    def _replay(self, journal_path, tasks_by_id, data):
+        if not os.path.exists(journal_path):
+            return 0
+
+        count = 0
+        good_offset = 0
+        with open(journal_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = codec.loads(line)
+                except ValueError:
+                    break
+                apply_record(tasks_by_id, data, record)
+                good_offset += len(line)
+                count += 1
+
+        # Хвост после последней целой записи — оборванная запись при падении, отрезаем её
+        if good_offset != os.path.getsize(journal_path):
+            with open(journal_path, 'r+b') as f:
+                f.truncate(good_offset)
+        return count
+
+    def save(self, data=None):
+        with self.lock:
+            if data is not None:
+                self.data = data
+                self._build_indexes()
+                self._bump_generation()
+            self.compact()
+
+    def _persist(self, op, changed, deleted, categories):
+        self._persist_batch([(op, changed, deleted, categories, self.generation)])
+
+    def _persist_batch(self, batch):
+        with self.lock:
+            lines = []
+            for op, changed, deleted, categories, generation in batch:
+                record = {"op": op, "generation": generation}
+                if changed:
+                    record["tasks"] = list(changed)
+                if deleted:
+                    record["deleted"] = list(deleted)
+                if categories:
+                    record["categories"] = self.data["categories"]
+                # Журнал всегда построчный JSON, какой бы ни был формат снимка
+                lines.append(codec.dumps(record) + b"\n")
+
+            with open(self.journal_path, 'ab') as f:
+                f.write(b"".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_records += len(lines)
+
+            # Поток уплотнения запускаем, только если прежний уже закончился: иначе каждый commit() до того,
+            # как поток возьмёт блокировку, запускал бы ещё один, а close() ждал бы не тот
+            if self.journal_records >= self.compact_every and not self.compaction_scheduled:
+                self.compaction_scheduled = True
+                self.compaction_thread = threading.Thread(target=self._compact_in_background, daemon=True)
+                self.compaction_thread.start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        finally:
+            with self.lock:
+                self.compaction_scheduled = False
+
+    def compact(self):
+        with self.lock:
+            if self.compaction_in_progress:
+                # Снимок уже снят раньше этого вызова — повторим уплотнение, когда текущее закончится
+                self.compaction_requested = True
+                return
+            compaction_fd = self._try_lock_compaction()
+            if compaction_fd is None:
+                # Журнал прямо сейчас уплотняет другой воркер
+                return
+            # Снимок строится из свежих данных: записи других воркеров могли ещё не дойти до этого процесса
+            self.get()
+            self.compaction_in_progress = True
+            self.compaction_requested = False
+            if os.path.exists(self.compacting_path):
+                # Предыдущее уплотнение оборвалось: склеиваем его записи с журналом, сохраняя порядок
+                with open(self.compacting_path, 'rb') as f:
+                    pending = f.read()
+                if os.path.exists(self.journal_path):
+                    with open(self.journal_path, 'rb') as f:
+                        pending += f.read()
+                with open(self.journal_path, 'wb') as f:
+                    f.write(pending)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.remove(self.compacting_path)
+            snapshot = codec.encode_data(self.data)
+            if os.path.exists(self.journal_path):
+                os.replace(self.journal_path, self.compacting_path)
+            self.journal_records = 0
+
+        # Снимок пишется вне блокировки хранилища: новые изменения тем временем идут в свежий журнал.
+        # Подмена снимка и удаление .compacting — под блокировкой, чтобы читатель не увидел их по отдельности
+        try:
+            with metrics.timed("compact"):
+                tmp_path = write_temp(self.path, snapshot)
+            with self.lock:
+                os.replace(tmp_path, self.path)
+                self.mtime = self._file_mtime()
+                if os.path.exists(self.compacting_path):
+                    os.remove(self.compacting_path)
+        finally:
+            with self.lock:
+                self.compaction_in_progress = False
+                rerun = self.compaction_requested
+            self._unlock_compaction(compaction_fd)
+        if rerun:
+            self.compact()
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    date TEXT,
+    original_task_id INTEGER,
+    completed_at TEXT,
+    category_id INTEGER,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_date ON tasks (date);
+CREATE INDEX IF NOT EXISTS idx_tasks_original_task_id ON tasks (original_task_id);
+-- По категории и дате выполнения выборок нет (статистика считает их по колонкам в памяти, поиск — по своему
+-- индексу), а индекс пришлось бы обновлять при каждой записи; в файлах прежних версий он ещё есть
+DROP INDEX IF EXISTS idx_tasks_completed_at;
+DROP INDEX IF EXISTS idx_tasks_category_id;
+CREATE TABLE IF NOT EXISTS archived_tasks (
+    id INTEGER PRIMARY KEY,
+    date TEXT,
+    original_task_id INTEGER,
+    completed_at TEXT,
+    category_id INTEGER,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deleted_tasks (
+    id INTEGER PRIMARY KEY,
+    generation INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    body TEXT NOT NULL
+);
+"""
+
+
+def task_row(task):
+    day = task_day(task)
+    return (
+        task["id"],
+        day.isoformat() if day else None,
+        task.get("original_task_id"),
+        task.get("completed_at"),
+        task.get("category_id"),
+        codec.dumps(task).decode("utf-8"),
+    )
+
+
+# SQLite-бэкенд: каждая задача — строка с индексированными колонками и полным JSON в body,
+# изменения пишутся построчно, а выборки по дню и по шаблону идут по индексам
+class SqliteTaskStore(TaskStore):
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SQLITE_SCHEMA)
+        super().__init__(path)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+        super().close()
+
+    def data_files(self):
+        # Архив лежит в той же базе
+        return [self.path, f"{self.path}-wal"]
+
+    def _file_mtime(self):
+        # Изменения из других соединений видны по PRAGMA data_version, mtime файла для SQLite не показатель
+        return self.db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _read_file(self):
+        data = empty_data()
+        data["tasks"] = [codec.loads(body) for (body,) in self.db.execute("SELECT body FROM tasks ORDER BY id")]
+        data["categories"] = [codec.loads(body) for (body,) in self.db.execute("SELECT body FROM categories ORDER BY id")]
+        data["deleted"] = [list(row) for row in self.db.execute("SELECT id, generation FROM deleted_tasks ORDER BY generation")]
+        return data
+
+    def save(self, data=None):
+        with self.lock:
+            if data is not None:
+                self.data = data
+                self._build_indexes()
+            with self.db:
+                self.db.execute("DELETE FROM tasks")
+                self.db.executemany("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?)",
+                                    [task_row(t) for t in self.data["tasks"]])
+                self.db.execute("DELETE FROM deleted_tasks")
+                self._write_tombstones(self.data["deleted"])
+                self._write_categories()
+            if data is not None:
+                self._bump_generation()
+
+    def _write_tombstones(self, tombstones):
+        self.db.executemany("INSERT OR REPLACE INTO deleted_tasks VALUES (?, ?)", [tuple(t) for t in tombstones])
+
+    def _write_categories(self):
+        self.db.execute("DELETE FROM categories")
+        self.db.executemany("INSERT OR REPLACE INTO categories VALUES (?, ?)",
+                            [(c["id"], codec.dumps(c).decode("utf-8")) for c in self.data["categories"]])
+
+    def _persist(self, op, changed, deleted, categories):
+        self._persist_batch([(op, changed, deleted, categories, self.generation)])
+
+    def _persist_batch(self, batch):
+        # Вся пачка — одна транзакция
+        with self.lock:
+            with self.db:
+                for op, changed, deleted, categories, generation in batch:
+                    if deleted:
+                        self.db.executemany("DELETE FROM tasks WHERE id = ?", [(task_id,) for task_id in deleted])
+                        self._write_tombstones([(task_id, generation) for task_id in deleted])
+                    if changed:
+                        self.db.executemany("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?)",
+                                            [task_row(t) for t in changed])
+                    if categories:
+                        self._write_categories()
+                tombstones = self.data["deleted"]
+                if len(tombstones) >= TOMBSTONE_LIMIT:
+                    # В памяти старые удаления уже отброшены — так же и в базе
+                    self.db.execute("DELETE FROM deleted_tasks WHERE generation < ?", (tombstones[0][1],))
+
+    def _read_archive(self):
+        return [codec.loads(body) for (body,) in self.db.execute("SELECT body FROM archived_tasks ORDER BY id")]
+
+    def _write_archive(self, added, removed_ids):
+        with self.db:
+            self.db.executemany("DELETE FROM archived_tasks WHERE id = ?", [(task_id,) for task_id in removed_ids])
+            self.db.executemany("INSERT OR REPLACE INTO archived_tasks VALUES (?, ?, ?, ?, ?, ?)",
+                                [task_row(t) for t in added])
+
+    def archive_last_id(self):
+        return self.db.execute("SELECT MAX(id) FROM archived_tasks").fetchone()[0] or 0
+
+    def _select(self, where, params):
+        # Индекс отдаёт только id, сами задачи берём из памяти — без разбора JSON из body
+        with self.lock.shared:
+            rows = self.db.execute(f"SELECT id FROM tasks WHERE {where} ORDER BY id", params)
+            return [self.by_id[task_id] for (task_id,) in rows if task_id in self.by_id]
+
+    def tasks_on(self, day):
+        return self._select("date = ?", (day.isoformat(),))
+
+    def tasks_between(self, date_from, date_to):
+        return self._select("date BETWEEN ? AND ?", (date_from.isoformat(), date_to.isoformat()))
+
+    def tasks_for_template(self, template_id):
+        return self._select("original_task_id = ?", (template_id,))
+
+    def migrate_from_json(self, json_path):
+        source = TaskStore(json_path)
+        self.save(source.data)
+
+
+def sqlite_path(path):
+    return os.path.splitext(path)[0] + ".sqlite3"
+
+
+def open_store(path, mode="json"):
+    if mode == "journal":
+        return JournalTaskStore(path)
+    if mode == "sqlite":
+        db_path = sqlite_path(path)
+        is_new = not os.path.exists(db_path)
+        store = SqliteTaskStore(db_path)
+        # Первый запуск в SQLite-режиме: разово переносим данные из JSON-файла
+        if is_new and os.path.exists(path):
+            store.migrate_from_json(path)
+        return store
+    return TaskStore(path)
+
+
+if __name__ == '__main__':
+    # python store.py migrate [tasks_data.json] [tasks_data.sqlite3]
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        json_path = sys.argv[2] if len(sys.argv) > 2 else "tasks_data.json"
+        db_path = sys.argv[3] if len(sys.argv) > 3 else sqlite_path(json_path)
+        SqliteTaskStore(db_path).migrate_from_json(json_path)
+        print(f"Migrated {json_path} -> {db_path}")
+    # python store.py format pretty|compact|msgpack [tasks_data.json] — переписать файл данных в другом формате
+    elif len(sys.argv) >= 3 and sys.argv[1] == "format":
+        json_path = sys.argv[3] if len(sys.argv) > 3 else "tasks_data.json"
+        source = TaskStore(json_path)
+        with source.lock:
+            atomic_write(json_path, codec.encode_data(source.get(), sys.argv[2]))
+        print(f"Rewrote {json_path} as {sys.argv[2]}")
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from changelog import ChangeLog
+from store import open_store
+
+STORAGE_MODES = ["json", "journal", "sqlite"]
+
+
+def task(task_id):
+    return {"id": task_id, "title": f"Задача {task_id}", "date": "2026-10-17", "created_at": "2026-10-17",
+            "repeat_interval": "none", "completed": False, "completed_at": None, "original_task_id": None}
+
+
+@pytest.fixture
+def workers(tmp_path, request):
+    # Два хранилища на одном файле — как два воркера gunicorn
+    path = tmp_path / "tasks_data.json"
+    path.write_text(json.dumps({"tasks": [task(1), task(2), task(3)], "categories": []}))
+    stores = [open_store(str(path), request.param) for _ in range(2)]
+    yield stores
+    for store in stores:
+        store.close()
+
+
+def update_title(store, task_id, title):
+    with store.lock:
+        store.get()
+        changed = store.get_task(task_id)
+        changed["title"] = title
+        store.commit("update", changed=[changed])
+
+
+@pytest.mark.parametrize("workers", STORAGE_MODES, indirect=True)
+def test_changes_survive_reload_after_other_worker_writes(workers):
+    reader, writer = workers
+    change_log = ChangeLog()
+    reader.subscribe(change_log)
+    update_title(reader, 1, "Своя правка")
+    since = reader.generation
+
+    update_title(writer, 2, "Чужая правка")
+    with writer.lock:
+        writer.get()
+        writer.commit("delete", deleted=writer.remove_tasks([3]))
+
+    reader.get()
+    assert change_log.since(reader, since) == {2: False, 3: True}
+    assert change_log.since(reader, since - 1) == {1: False, 2: False, 3: True}
+
+
+@pytest.mark.parametrize("workers", STORAGE_MODES, indirect=True)
+def test_changes_survive_batch_rollback(workers):
+    store, _ = workers
+    change_log = ChangeLog()
+    store.subscribe(change_log)
+    since = store.generation or 0
+    update_title(store, 1, "Правка")
+
+    # Откат пачки перечитывает хранилище — изменения до неё должны остаться в журнале
+    with pytest.raises(RuntimeError):
+        with store.lock, store.savepoint():
+            update_title(store, 2, "Отменённая правка")
+            raise RuntimeError
+    assert change_log.since(store, since) == {1: False}
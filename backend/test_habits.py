@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+
+from habits import HabitState, RepeatRule
+from store import TaskRecord
+
+TODAY = date(2026, 10, 17)
+
+
+def daily_habit(created):
+    record = TaskRecord({"id": 1, "date": created.isoformat(), "created_at": created.isoformat(),
+                         "repeat_interval": "daily", "repeat_days": None, "repeat_until": None})
+    return HabitState(RepeatRule(record))
+
+
+def test_future_completion_does_not_count_before_its_day():
+    state = daily_habit(TODAY)
+    state.add(TODAY + timedelta(days=1))
+    state.add(TODAY)
+
+    summary = state.summary(TODAY)
+    assert summary["total_completions"] == 1
+    assert summary["scheduled_occurrences"] == 1
+    assert summary["completion_rate"] == 100.0
+    assert summary["longest_streak"] == 1
+    assert summary["current_streak"] == 1
+
+    # Когда день наступил, выполнение учитывается
+    summary = state.summary(TODAY + timedelta(days=1))
+    assert summary["total_completions"] == 2
+    assert summary["longest_streak"] == 2
+
+
+def test_longest_streak_ignores_runs_entirely_in_the_future():
+    state = daily_habit(TODAY - timedelta(days=9))
+    for offset in (-9, -8, -5):
+        state.add(TODAY + timedelta(days=offset))
+    for offset in range(1, 5):
+        state.add(TODAY + timedelta(days=offset))
+
+    summary = state.summary(TODAY)
+    assert summary["total_completions"] == 3
+    assert summary["scheduled_occurrences"] == 10
+    assert summary["longest_streak"] == 2
+    assert summary["current_streak"] == 0
+
+
+def test_removing_completion_updates_clamped_totals():
+    state = daily_habit(TODAY - timedelta(days=2))
+    for offset in (-2, -1, 0, 1):
+        state.add(TODAY + timedelta(days=offset))
+    state.remove(TODAY - timedelta(days=1))
+
+    summary = state.summary(TODAY)
+    assert summary["total_completions"] == 2
+    assert summary["longest_streak"] == 1
+    assert summary["current_streak"] == 1
@@ -0,0 +1,43 @@
+import json
+from datetime import datetime
+
+from notifications import NOTIFY_BEFORE, NotificationScheduler
+from store import open_store
+
+
+def due_task(task_id):
+    # Срок напоминания — текущая минута: задача на время «через 30 минут»
+    at = datetime.now() + NOTIFY_BEFORE
+    return {"id": task_id, "title": "Позвонить", "description": "", "date": at.date().isoformat(),
+            "created_at": at.date().isoformat(), "time": at.strftime("%H:%M"), "repeat_interval": "none",
+            "completed": False, "completed_at": None, "original_task_id": None}
+
+
+def open_scheduler(tmp_path):
+    path = tmp_path / "tasks_data.json"
+    path.write_text(json.dumps({"tasks": [due_task(1)], "categories": []}))
+    store = open_store(str(path))
+    scheduler = NotificationScheduler()
+    store.subscribe(scheduler)
+    return store, scheduler
+
+
+def test_reload_does_not_repeat_fired_reminder(tmp_path):
+    store, scheduler = open_scheduler(tmp_path)
+    events, last_event_id = scheduler.wait(None, timeout=0)
+    assert [e["task_id"] for e in events] == [1]
+
+    store.reload()
+    assert scheduler.wait(last_event_id, timeout=0) == ([], last_event_id)
+
+
+def test_edit_without_new_deadline_does_not_repeat_reminder(tmp_path):
+    store, scheduler = open_scheduler(tmp_path)
+    events, last_event_id = scheduler.wait(None, timeout=0)
+    assert len(events) == 1
+
+    with store.lock:
+        task = store.get_task(1)
+        task["title"] = "Перезвонить"
+        store.commit("update", changed=[task])
+    assert scheduler.wait(last_event_id, timeout=0) == ([], last_event_id)
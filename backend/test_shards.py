@@ -0,0 +1,91 @@
+import importlib
+import sys
+import threading
+
+import pytest
+
+from shards import ShardPool
+
+
+class FakeShard:
+    def __init__(self, user_key):
+        self.user_key = user_key
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_opening_a_shard_does_not_block_other_users():
+    slow_started = threading.Event()
+    slow_open = threading.Event()
+    opened = []
+
+    def open_shard(user_key, create):
+        opened.append(user_key)
+        if user_key == "slow":
+            slow_started.set()
+            assert slow_open.wait(5)
+        return FakeShard(user_key)
+
+    pool = ShardPool(open_shard)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.acquire("slow"))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    assert slow_started.wait(5)
+    # Пока «slow» открывается, другой пользователь получает свой шард сразу
+    assert pool.acquire("fast").user_key == "fast"
+    slow_open.set()
+    for thread in threads:
+        thread.join()
+
+    assert results[0] is results[1]
+    assert sorted(opened) == ["fast", "slow"]
+    assert pool.in_use == {"slow": 2, "fast": 1}
+
+
+def test_failed_open_lets_next_request_retry():
+    attempts = []
+
+    def open_shard(user_key, create):
+        attempts.append(user_key)
+        if len(attempts) == 1:
+            raise OSError("disk")
+        return FakeShard(user_key)
+
+    pool = ShardPool(open_shard)
+    with pytest.raises(OSError):
+        pool.acquire("a")
+    assert pool.acquire("a").user_key == "a"
+    assert pool.opening == {}
+
+
+def test_unknown_user_is_not_created_by_reads():
+    pool = ShardPool(lambda user_key, create: FakeShard(user_key) if create else None)
+    assert pool.acquire("new", create=False) is None
+    assert pool.shards == {} and pool.in_use == {}
+    assert pool.acquire("new").user_key == "new"
+    assert pool.acquire("new", create=False) is pool.shards["new"]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sys.modules.pop("main", None)
+    main = importlib.import_module("main")
+    yield main.app.test_client()
+    for shard in [main.default_shard] + main.user_shards.open_shards():
+        shard.close()
+    sys.modules.pop("main", None)
+
+
+def test_reads_of_unknown_user_leave_no_directory(client, tmp_path):
+    for path in ["/users/nobody/tasks/", "/users/nobody/categories/", "/users/nobody/stats/"]:
+        assert client.get(path).status_code == 404
+    assert not (tmp_path / "users" / "nobody").exists()
+
+    assert client.post("/users/somebody/tasks/", json={"title": "Первая"}).status_code == 201
+    assert (tmp_path / "users" / "somebody").is_dir()
+    response = client.get("/users/somebody/tasks/")
+    assert response.status_code == 200 and "Первая" in response.get_data(as_text=True)
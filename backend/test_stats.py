@@ -0,0 +1,32 @@
+from datetime import date, timedelta
+
+from stats import StatsColumns, StatsEngine
+from store import TaskRecord
+
+TODAY = date(2026, 10, 17)
+
+
+def task(task_id, day, completed_on=None, original_task_id=2):
+    return TaskRecord({"id": task_id, "date": day.isoformat(), "created_at": day.isoformat(),
+                       "repeat_interval": "none", "priority": "medium", "estimated_time": 30,
+                       "completed": completed_on is not None,
+                       "completed_at": completed_on.isoformat() + "T09:00:00" if completed_on else None,
+                       "original_task_id": original_task_id})
+
+
+def test_range_counts_tasks_completed_after_their_day():
+    yesterday = TODAY - timedelta(days=1)
+    records = [task(1, yesterday, completed_on=TODAY), task(3, yesterday)]
+
+    summary = StatsEngine(records).report(yesterday, yesterday)["summary"]
+    assert summary["total_tasks"] == 2
+    assert summary["completed_tasks"] == 1
+    assert summary["completed_time_minutes"] == 30
+
+
+def test_today_counts_only_same_day_completions():
+    records = [task(1, TODAY, completed_on=TODAY), task(3, TODAY, completed_on=TODAY + timedelta(days=1))]
+
+    summary = StatsColumns(records, same_day=True).summarize_range(TODAY, TODAY)
+    assert summary["total_tasks"] == 2
+    assert summary["completed_tasks"] == 1
@@ -0,0 +1,156 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from store import PersistError, open_store
+
+STORAGE_MODES = ["json", "journal", "sqlite"]
+
+
+def task(task_id, day, completed=False):
+    return {"id": task_id, "title": f"Задача {task_id}", "date": day, "created_at": day,
+            "repeat_interval": "none", "completed": completed,
+            "completed_at": day + "T10:00:00" if completed else None, "original_task_id": None}
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / "tasks_data.json"
+    path.write_text(json.dumps({"tasks": [task(1, "2026-10-01"), task(2, "2026-01-05", completed=True)],
+                                "categories": []}))
+    return str(path)
+
+
+@pytest.mark.parametrize("mode", STORAGE_MODES)
+def test_next_id_skips_archived_ids(data_path, mode):
+    store = open_store(data_path, mode)
+    try:
+        with store.lock:
+            store.get()
+            assert store.archive_completed(date(2026, 6, 1)) == 1
+        assert store.next_id() == 3
+
+        # После перечитывания (другой процесс, перезапуск) счётчик тоже учитывает архив
+        store.reload()
+        assert store.next_id() == 4
+        assert [r.id for r in store.archived_records()] == [2]
+    finally:
+        store.close()
+
+
+def test_readers_share_the_lock_across_threads_and_processes(data_path):
+    fcntl = pytest.importorskip("fcntl")
+    store = open_store(data_path)
+    inside = threading.Event()
+    leave = threading.Event()
+
+    def reader():
+        with store.lock.shared:
+            inside.set()
+            leave.wait(5)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    try:
+        assert inside.wait(5)
+        # Второй читатель того же процесса и читатель другого воркера (свой дескриптор) не ждут первого
+        with store.lock.shared:
+            assert store.get() is store.data
+        fd = os.open(store.lock.path, os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        finally:
+            os.close(fd)
+    finally:
+        leave.set()
+        thread.join()
+        store.close()
+
+
+def test_get_does_not_wait_for_other_workers_readers(data_path):
+    fcntl = pytest.importorskip("fcntl")
+    store = open_store(data_path)
+    fd = os.open(store.lock.path, os.O_RDWR)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        done = threading.Event()
+        thread = threading.Thread(target=lambda: (store.get(), done.set()))
+        thread.start()
+        assert done.wait(5)
+        thread.join()
+    finally:
+        os.close(fd)
+        store.close()
+
+
+def test_writer_excludes_readers(data_path):
+    store = open_store(data_path)
+    entered = threading.Event()
+    try:
+        with store.lock:
+            thread = threading.Thread(target=lambda: (store.lock.acquire_shared(), entered.set(), store.lock.release_shared()))
+            thread.start()
+            assert not entered.wait(0.2)
+        assert entered.wait(5)
+        thread.join()
+
+        with store.lock.shared:
+            with pytest.raises(RuntimeError):
+                store.lock.acquire()
+    finally:
+        store.close()
+
+
+def test_writer_lets_waiting_readers_in_between_batch_requests(data_path):
+    store = open_store(data_path)
+    seen = []
+    try:
+        with store.lock, store.batch():
+            task = store.get_task(1)
+            task["title"] = "Изменена в пачке"
+            store.commit("update", changed=[task])
+
+            def reader():
+                with store.lock.shared:
+                    seen.append(store.get_task(1)["title"])
+
+            thread = threading.Thread(target=reader)
+            thread.start()
+            while not store.lock.waiting_readers:
+                time.sleep(0.01)
+            store.lock.let_readers_in()
+            # Читатель прошёл, пока пачка ещё открыта и не записана на диск
+            assert seen == ["Изменена в пачке"]
+            assert store.pending
+            thread.join()
+    finally:
+        store.close()
+
+
+@pytest.mark.parametrize("mode", STORAGE_MODES)
+def test_failed_write_raises_and_keeps_memory_as_on_disk(data_path, mode, monkeypatch):
+    store = open_store(data_path, mode)
+
+    def disk_full(*args):
+        raise OSError(28, "No space left on device")
+
+    try:
+        monkeypatch.setattr(store, "_persist", disk_full)
+        monkeypatch.setattr(store, "_persist_batch", disk_full)
+        for use_batch in (False, True):
+            with pytest.raises(PersistError):
+                with store.lock, (store.batch() if use_batch else contextlib.nullcontext()):
+                    task = store.get_task(1)
+                    task["title"] = "Не записано"
+                    store.commit("update", changed=[task])
+            assert store.get_task(1)["title"] == "Задача 1"
+    finally:
+        store.close()
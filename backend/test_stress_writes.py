@@ -0,0 +1,59 @@
+# Запись из нескольких процессов, как у gunicorn/uWSGI с несколькими воркерами: каждый процесс создаёт
+# и выполняет задачи через API, в конце все созданные задачи и отметки о выполнении должны быть на месте
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+from store import open_store
+
+PROCESSES = 4
+TASKS_PER_PROCESS = 20
+
+
+def worker(workdir, mode, worker_no, count, results):
+    os.chdir(workdir)
+    os.environ["STORAGE_MODE"] = mode
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from main import app
+
+    client = app.test_client()
+    created = []
+    for i in range(count):
+        response = client.post('/tasks/', json={"title": f"worker {worker_no} task {i}"})
+        task_id = response.get_json()["id"]
+        created.append(task_id)
+        if i % 2 == 0:
+            client.put(f'/tasks/{task_id}/complete')
+    results.put((worker_no, created))
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("mode", ["json", "journal", "sqlite"])
+def test_workers_do_not_lose_writes(tmp_path, mode):
+    # spawn — каждый воркер сам импортирует приложение и открывает хранилище, как отдельный процесс сервера
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [context.Process(target=worker, args=(str(tmp_path), mode, n, TASKS_PER_PROCESS, results))
+               for n in range(PROCESSES)]
+    for process in workers:
+        process.start()
+    created = dict(results.get(timeout=120) for _ in workers)
+    for process in workers:
+        process.join()
+
+    store = open_store(str(tmp_path / "tasks_data.json"), mode)
+    try:
+        tasks = store.get()["tasks"]
+    finally:
+        store.close()
+    by_id = {t["id"]: t for t in tasks}
+
+    all_ids = [task_id for ids in created.values() for task_id in ids]
+    assert len(set(all_ids)) == len(all_ids), "duplicate ids handed out"
+    assert len(by_id) == len(tasks), "duplicate ids stored"
+    assert [task_id for task_id in all_ids if task_id not in by_id] == [], "lost tasks"
+    lost_completions = [task_id for ids in created.values() for i, task_id in enumerate(ids)
+                        if by_id[task_id]["completed"] != (i % 2 == 0)]
+    assert lost_completions == []
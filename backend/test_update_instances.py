@@ -0,0 +1,89 @@
+import importlib
+import json
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+TODAY = date.today()
+START = TODAY - timedelta(days=45)
+WEEKDAYS = "0,2,4"
+
+RULES = {
+    "daily": lambda day: True,
+    "weekly": lambda day: day.weekday() in (0, 2, 4),
+    "monthly": lambda day: day.day == START.day,
+    "none": lambda day: day == START,
+}
+
+
+def template(interval, repeat_until=None):
+    return {"id": 1, "title": "Привычка", "description": "", "category_id": None, "priority": "medium",
+            "estimated_time": 0, "date": START.isoformat(), "created_at": START.isoformat(),
+            "repeat_interval": interval, "repeat_days": WEEKDAYS if interval == "weekly" else None,
+            "repeat_until": repeat_until, "completed": False, "completed_at": None,
+            "original_task_id": None, "is_exception": False}
+
+
+def instance(task_id, day):
+    task = template("none")
+    task.update({"id": task_id, "date": day.isoformat(), "created_at": day.isoformat(), "original_task_id": 1})
+    return task
+
+
+@pytest.fixture
+def open_app(tmp_path, monkeypatch):
+    # main открывает tasks_data.json в текущем каталоге при импорте — каждому тесту свой каталог и свежий модуль
+    monkeypatch.chdir(tmp_path)
+    opened = []
+
+    def open_app(interval):
+        past_days = [START + timedelta(days=i) for i in range((TODAY - START).days)]
+        days = [day for day in past_days if RULES[interval](day)]
+        tasks = [template(interval)] + [instance(2 + i, day) for i, day in enumerate(days)]
+        (tmp_path / "tasks_data.json").write_text(json.dumps({"tasks": tasks, "categories": []}))
+        sys.modules.pop("main", None)
+        main = importlib.import_module("main")
+        opened.append(main)
+        return main, days
+
+    yield open_app
+    for main in opened:
+        main.default_shard.close()
+    sys.modules.pop("main", None)
+
+
+def past_instance_days(main):
+    return sorted(day for day in main.default_shard.store.instance_days(1) if day < TODAY)
+
+
+@pytest.mark.parametrize("old, new", [
+    ("daily", "weekly"),
+    ("daily", "monthly"),
+    ("daily", "none"),
+    ("weekly", "daily"),
+    ("weekly", "monthly"),
+    ("monthly", "daily"),
+    ("monthly", "weekly"),
+    ("none", "daily"),
+])
+def test_update_keeps_only_instances_of_new_rule(open_app, old, new):
+    main, days = open_app(old)
+    assert past_instance_days(main) == days
+
+    body = {"title": "Привычка", "repeat_interval": new, "repeat_days": WEEKDAYS if new == "weekly" else None}
+    response = main.app.test_client().put("/tasks/1", json=body)
+    assert response.status_code == 200
+
+    assert past_instance_days(main) == [day for day in days if RULES[new](day)]
+
+
+def test_update_drops_instances_after_repeat_until(open_app):
+    main, days = open_app("daily")
+    until = START + timedelta(days=10)
+
+    body = {"title": "Привычка", "repeat_interval": "daily", "repeat_until": until.isoformat()}
+    response = main.app.test_client().put("/tasks/1", json=body)
+    assert response.status_code == 200
+
+    assert past_instance_days(main) == [day for day in days if day <= until]
@@ -16,59 +16,61 @@ self.addEventListener('activate', (event) => {
   startNotificationChecking();
 });
 
-// Функция периодической проверки уведомлений
-function startNotificationChecking() {
-  // Проверяем каждую минуту
-  setInterval(async () => {
+// Long-poll вместо проверки раз в минуту: сервер отвечает, как только наступает время напоминания.
+// Пока открыта вкладка приложения, напоминания показывает она (EventSource), Service Worker сервер не опрашивает
+let notificationLoopStarted = false;
+let lastEventId = null;
+
+async function hasOpenClients() {
+  const clientsList = await clients.matchAll({
+    type: 'window',
+    includeUncontrolled: true
+  });
+  return clientsList.length > 0;
+}
+
+async function startNotificationChecking() {
+  if (notificationLoopStarted) {
+    return;
+  }
+  notificationLoopStarted = true;
+  
+  while (true) {
     try {
-      const clientsList = await clients.matchAll({
-        type: 'window',
-        includeUncontrolled: true
-      });
-      
-      if (clientsList.length > 0) {
-        // Отправляем сообщение активному клиенту для проверки
-        clientsList.forEach(client => {
-          client.postMessage({
-            type: 'CHECK_NOTIFICATIONS',
-            time: new Date().toISOString()
-          });
-        });
-      } else {
-        // Если нет активных клиентов, проверяем из Service Worker
-        await checkNotificationsFromSW();
+      if (await hasOpenClients()) {
+        // Напоминания получает страница — проверяем раз в минуту, не закрыли ли её
+        lastEventId = null;
+        await new Promise(resolve => setTimeout(resolve, 60000));
+        continue;
       }
+      await checkNotificationsFromSW();
     } catch (error) {
       console.error('Error in notification check:', error);
+      // Сервер недоступен — пробуем снова через минуту
+      await new Promise(resolve => setTimeout(resolve, 60000));
     }
-  }, 60000); // Каждую минуту
-  
-  // Проверяем сразу при активации
-  checkNotificationsFromSW();
+  }
 }
 
-// Проверка уведомлений из Service Worker
+// Ожидание уведомлений из Service Worker
 async function checkNotificationsFromSW() {
-  try {
-    console.log('🔄 Service Worker: проверяю уведомления...');
-    
-    // Получаем задачи для уведомлений с сервера
-    const response = await fetch(`${API_BASE}/notifications/check`);
-    if (!response.ok) {
-      throw new Error('Failed to fetch notifications');
-    }
-    
-    const data = await response.json();
-    const notifications = data.notifications || [];
-    
+  const since = lastEventId !== null ? `&since=${lastEventId}` : '';
+  const response = await fetch(`${API_BASE}/notifications/poll?timeout=25${since}`);
+  if (!response.ok) {
+    throw new Error('Failed to fetch notifications');
+  }
+  
+  const data = await response.json();
+  const notifications = data.notifications || [];
+  lastEventId = data.last_event_id;
+  
+  if (notifications.length > 0) {
     console.log(`📨 Найдено уведомлений: ${notifications.length}`);
-    
-    // Показываем каждое уведомление
-    for (const notification of notifications) {
-      await showNotificationFromSW(notification);
-    }
-  } catch (error) {
-    console.error('❌ Service Worker ошибка проверки:', error);
+  }
+  
+  // Показываем каждое уведомление
+  for (const notification of notifications) {
+    await showNotificationFromSW(notification);
   }
 }
 
@@ -78,7 +80,8 @@ async function showNotificationFromSW(notificationData) {
     body: `Через 30 минут: ${notificationData.title}`,
     icon: '/vite.svg',
     badge: '/vite.svg',
-    tag: `task-${notificationData.task_id}`,
+    // Тот же тег, что у уведомлений страницы: одно напоминание не покажется дважды
+    tag: `task-reminder-${notificationData.task_id}`,
     requireInteraction: true,
     silent: false,
     vibrate: [200, 100, 200],
@@ -138,7 +141,7 @@ self.addEventListener('notificationclick', (event) => {
 self.addEventListener('message', (event) => {
   
   if (event.data && event.data.type === 'CHECK_NOTIFICATIONS_NOW') {
-    checkNotificationsFromSW();
+    startNotificationChecking();
   }
 });
 
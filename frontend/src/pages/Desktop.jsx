@@ -62,7 +62,7 @@ function App() {
 
   const [notificationsEnabled, setNotificationsEnabled] = useState(false);
   const [serviceWorkerReady, setServiceWorkerReady] = useState(false);
-  const notificationCheckInterval = useRef(null);
+  const notificationSource = useRef(null);
   const [notificationsHistory, setNotificationsHistory] = useState([]);
   const swRegistrationRef = useRef(null);
 
@@ -75,8 +75,8 @@ function App() {
     initializeNotifications();
     
     return () => {
-      if (notificationCheckInterval.current) {
-        clearInterval(notificationCheckInterval.current);
+      if (notificationSource.current) {
+        notificationSource.current.close();
       }
     };
   }, []);
@@ -166,63 +166,26 @@ function App() {
     }
   };
 
-  // Проверка уведомлений каждую минуту
+  // Напоминания приходят с сервера через Server-Sent Events — без опроса /tasks/ каждую минуту
   const startNotificationChecking = () => {
-    // Очищаем предыдущий интервал
-    if (notificationCheckInterval.current) {
-      clearInterval(notificationCheckInterval.current);
+    if (notificationSource.current) {
+      notificationSource.current.close();
     }
     
-    // Запускаем новый интервал
-    notificationCheckInterval.current = setInterval(async () => {
-      await checkTasksForNotifications();
-    }, 60000); // Каждую минуту
-    
-    // Проверяем сразу
-    checkTasksForNotifications();
-  };
-
-  // Проверка задач для уведомлений
-  const checkTasksForNotifications = async () => {
-    try {
-      
-      // Получаем текущее время
-      const now = new Date();
-      const currentHour = now.getHours();
-      const currentMinute = now.getMinutes();
-      const currentTotalMinutes = currentHour * 60 + currentMinute;
-      
-      // Получаем все задачи
-      const response = await axios.get(`${API_BASE}/tasks/`);
-      const { today_active } = response.data;
-      
-      // Проверяем каждую задачу
-      today_active.forEach(task => {
-        if (task.time && !task.completed) {
-          try {
-            // Парсим время задачи
-            const [taskHour, taskMinute] = task.time.split(':').map(Number);
-            const taskTotalMinutes = taskHour * 60 + taskMinute;
-            
-            // Разница в минутах
-            const diffMinutes = taskTotalMinutes - currentTotalMinutes;
-            
-            // Логируем для отладки
-            console.log(`Задача: ${task.title}, время: ${task.time}, разница: ${diffMinutes} мин`);
-            
-            // Если задача через 30 минут (±2 минуты)
-            if (diffMinutes == 30) {
-              console.log(`⏰ Отправляю уведомление для: ${task.title}`);
-              sendBrowserNotification(task);
-            }
-          } catch (error) {
-            console.error('Ошибка парсинга времени:', error);
-          }
-        }
-      });
-    } catch (error) {
-      console.error('Ошибка проверки уведомлений:', error);
-    }
+    const source = new EventSource(`${API_BASE}/notifications/stream`);
+    source.onmessage = (event) => {
+      try {
+        const reminder = JSON.parse(event.data);
+        sendBrowserNotification({ id: reminder.task_id, title: reminder.title, time: reminder.time });
+      } catch (error) {
+        console.error('Ошибка разбора уведомления:', error);
+      }
+    };
+    // При обрыве EventSource переподключается сам и передаёт Last-Event-ID
+    source.onerror = () => {
+      console.log('🔄 Переподключение к потоку уведомлений...');
+    };
+    notificationSource.current = source;
   };
 
   // Отправка браузерного уведомления
@@ -1199,32 +1162,15 @@ const TaskCalendar = ({ tasks, categories, onComplete, onDelete, getPriorityColo
       const firstDay = new Date(year, month, 1)
       const lastDay = new Date(year, month + 1, 0)
       
-      const tasksPromises = []
-      const current = new Date(firstDay)
-      
-      while (current <= lastDay) {
-        const dateString = current.toISOString().split('T')[0]
-        tasksPromises.push(
-          axios.get(`${API_BASE}/calendar/${dateString}`)
-            .then(response => ({ 
-              date: dateString, 
-              tasks: response.data.tasks || [] 
-            }))
-            .catch(error => {
-              console.error(`Error loading tasks for ${dateString}:`, error)
-              return { date: dateString, tasks: [] }
-            })
-        )
-        current.setDate(current.getDate() + 1)
-      }
-      
-      const results = await Promise.all(tasksPromises)
-      const tasksMap = {}
-      results.forEach(result => {
-        tasksMap[result.date] = result.tasks
+      // Один запрос на весь месяц вместо запроса на каждый день
+      const response = await axios.get(`${API_BASE}/calendar`, {
+        params: {
+          from: firstDay.toISOString().split('T')[0],
+          to: lastDay.toISOString().split('T')[0]
+        }
       })
       
-      setMonthTasks(tasksMap)
+      setMonthTasks(response.data.days || {})
     } catch (error) {
       console.error('Error loading month tasks:', error)
     }
@@ -76,7 +76,7 @@ function App() {
 
   const [notificationsEnabled, setNotificationsEnabled] = useState(false);
   const [serviceWorkerReady, setServiceWorkerReady] = useState(false);
-  const notificationCheckInterval = useRef(null);
+  const notificationSource = useRef(null);
   const [notificationsHistory, setNotificationsHistory] = useState([]);
   const swRegistrationRef = useRef(null);
   
@@ -99,8 +99,8 @@ function App() {
     initializeNotifications();
     
     return () => {
-      if (notificationCheckInterval.current) {
-        clearInterval(notificationCheckInterval.current);
+      if (notificationSource.current) {
+        notificationSource.current.close();
       }
     };
   }, []);
@@ -183,46 +183,26 @@ function App() {
     }
   };
 
+  // Напоминания приходят с сервера через Server-Sent Events — без опроса /tasks/ каждую минуту
   const startNotificationChecking = () => {
-    if (notificationCheckInterval.current) {
-      clearInterval(notificationCheckInterval.current);
+    if (notificationSource.current) {
+      notificationSource.current.close();
     }
     
-    notificationCheckInterval.current = setInterval(async () => {
-      await checkTasksForNotifications();
-    }, 60000);
-    
-    checkTasksForNotifications();
-  };
-
-  const checkTasksForNotifications = async () => {
-    try {
-      const now = new Date();
-      const currentHour = now.getHours();
-      const currentMinute = now.getMinutes();
-      const currentTotalMinutes = currentHour * 60 + currentMinute;
-      
-      const response = await axios.get(`${API_BASE}/tasks/`)
-      const { today_active } = response.data;
-      
-      today_active.forEach(task => {
-        if (task.time && !task.completed) {
-          try {
-            const [taskHour, taskMinute] = task.time.split(':').map(Number);
-            const taskTotalMinutes = taskHour * 60 + taskMinute;
-            const diffMinutes = taskTotalMinutes - currentTotalMinutes;
-            
-            if (diffMinutes == 30) {
-              sendBrowserNotification(task);
-            }
-          } catch (error) {
-            console.error('Ошибка парсинга времени:', error);
-          }
-        }
-      });
-    } catch (error) {
-      console.error('Ошибка проверки уведомлений:', error);
-    }
+    const source = new EventSource(`${API_BASE}/notifications/stream`);
+    source.onmessage = (event) => {
+      try {
+        const reminder = JSON.parse(event.data);
+        sendBrowserNotification({ id: reminder.task_id, title: reminder.title, time: reminder.time });
+      } catch (error) {
+        console.error('Ошибка разбора уведомления:', error);
+      }
+    };
+    // При обрыве EventSource переподключается сам и передаёт Last-Event-ID
+    source.onerror = () => {
+      console.log('🔄 Переподключение к потоку уведомлений...');
+    };
+    notificationSource.current = source;
   };
 
   const sendBrowserNotification = (task) => {
@@ -1020,32 +1000,15 @@ const MobileTaskCalendar = ({ tasks, categories, onComplete, onDelete, getPriori
       const firstDay = new Date(year, month, 1)
       const lastDay = new Date(year, month + 1, 0)
       
-      const tasksPromises = []
-      const current = new Date(firstDay)
-      
-      while (current <= lastDay) {
-        const dateString = current.toISOString().split('T')[0]
-        tasksPromises.push(
-          axios.get(`${API_BASE}/calendar/${dateString}`)
-            .then(response => ({ 
-              date: dateString, 
-              tasks: response.data.tasks || [] 
-            }))
-            .catch(error => {
-              console.error(`Error loading tasks for ${dateString}:`, error)
-              return { date: dateString, tasks: [] }
-            })
-        )
-        current.setDate(current.getDate() + 1)
-      }
-      
-      const results = await Promise.all(tasksPromises)
-      const tasksMap = {}
-      results.forEach(result => {
-        tasksMap[result.date] = result.tasks
+      // Один запрос на весь месяц вместо запроса на каждый день
+      const response = await axios.get(`${API_BASE}/calendar`, {
+        params: {
+          from: firstDay.toISOString().split('T')[0],
+          to: lastDay.toISOString().split('T')[0]
+        }
       })
       
-      setMonthTasks(tasksMap)
+      setMonthTasks(response.data.days || {})
     } catch (error) {
       console.error('Error loading month tasks:', error)
     }